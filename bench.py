@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+# Benchmark tamamen offline: cache/state geçici dizinde, render thread pool'da
+os.environ.setdefault("IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="lapad-bench-img-"))
+os.environ.setdefault("STATE_DIR", tempfile.mkdtemp(prefix="lapad-bench-state-"))
+os.environ.setdefault("RENDER_POOL", "thread")
+
+from telethon.tl import types
+import contracts
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+
+
+def load_fixtures(path=FIXTURES_DIR):
+    with open(os.path.join(path, "messages.json"), encoding="utf-8") as f: messages = json.load(f)
+    with open(os.path.join(path, "pairs.json"), encoding="utf-8") as f: pairs = json.load(f)["pairs"]
+    with open(os.path.join(path, "logo.jpg"), "rb") as f: logo = f.read()
+    with open(os.path.join(path, "header.jpg"), "rb") as f: header = f.read()
+    return messages, pairs, logo, header
+
+
+def make_event(m):
+    entities = [getattr(types, e["type"])(**{k: v for k, v in e.items() if k != "type"}) for e in m.get("entities", [])]
+    return SimpleNamespace(chat_id=m["chat_id"], message=SimpleNamespace(message=m["text"], entities=entities or None))
+
+
+def trend_tokens(pairs):
+    # Filtreden bağımsız, her pair için bir Worldwide satırı
+    tokens = []
+    for p in pairs:
+        base, info = p["baseToken"], p.get("info") or {}
+        socials = {s["type"]: s["url"] for s in info.get("socials", [])}
+        change = abs(p["priceChange"].get("h24") or 0) + 10
+        tokens.append((change, "h24", base["symbol"], p["chainId"].capitalize(), info.get("imageUrl"), p["url"],
+                       socials.get("twitter"), socials.get("telegram")))
+    return sorted(tokens, key=lambda t: t[0], reverse=True)
+
+
+def stub_network(logo, header):
+    async def fetch_conditional(url, timeout=10, image_only=False, etag=None, last_modified=None, max_bytes=None):
+        return (header if "/header/" in url else logo), {"etag": None, "last_modified": None}
+
+    async def no_dexscreener(*args, **kwargs):
+        raise RuntimeError("DexScreener disabled in offline benchmark")
+
+    contracts.fetch_conditional = fetch_conditional
+    contracts.dex.get_json = no_dexscreener
+
+
+def build_cases(messages, pairs):
+    texts = [m["text"] for m in messages]
+    listing_texts = [m["text"] for m in messages if contracts.CHANNEL_PARSERS.get(m["chat_id"]) == "parse_cmclistingstg"]
+    events = [make_event(m) for m in messages]
+    tokens = trend_tokens(pairs)
+    banner_args = [
+        (p["baseToken"]["name"], p["baseToken"]["symbol"], p["chainId"].capitalize(), p["baseToken"]["address"],
+         (p.get("info") or {}).get("imageUrl"), f"https://{p['baseToken']['symbol'].lower()}.io", 42.0, "h1")
+        for p in pairs
+    ]
+    # (isim, fonksiyon, argüman listesi, async mi, varsayılan tekrar)
+    return [
+        ("extract_contract_candidates", contracts.extract_contract_candidates, [(t,) for t in texts], False, 5000),
+        ("parse_cmclistingstg", contracts.parse_cmclistingstg, [(t,) for t in listing_texts], False, 5000),
+        ("parse_trending_scrape", contracts.parse_trending_scrape, [(e,) for e in events], False, 5000),
+        ("parse_social_links", contracts.parse_social_links, [(p,) for p in pairs], False, 5000),
+        ("build_trends_caption", contracts.build_trends_caption, [(tokens,)], False, 5000),
+        ("format_pair_message", contracts.format_pair_message, [(p,) for p in pairs], True, 40),
+        ("generate_image_banner", contracts.generate_image_banner, banner_args, True, 40),
+        ("generate_worldwide_banner", contracts.generate_worldwide_banner, [(tokens,)], True, 20),
+    ]
+
+
+def run_case(loop, fn, args_list, iterations, is_async, memory_runs=5):
+    call = (lambda a: loop.run_until_complete(fn(*a))) if is_async else (lambda a: fn(*a))
+    for a in args_list: call(a)     # ısınma: cache'ler, fontlar, worker thread'ler
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        a = args_list[i % len(args_list)]
+        t = time.perf_counter()
+        call(a)
+        latencies.append(time.perf_counter() - t)
+    wall = time.perf_counter() - started
+    tracemalloc.start()
+    for i in range(max(memory_runs, len(args_list))): call(args_list[i % len(args_list)])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 4)
+    return {
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / wall, 1),
+        "mean_ms": ms(sum(latencies) / len(latencies)),
+        "p50_ms": ms(contracts.percentile(latencies, 0.50)),
+        "p95_ms": ms(contracts.percentile(latencies, 0.95)),
+        "p99_ms": ms(contracts.percentile(latencies, 0.99)),
+        "peak_py_kb": round(peak / 1024, 1),    # tracemalloc: Python heap; Pillow'un C buffer'ları dahil değil
+    }
+
+
+def print_table(results, baseline=None):
+    head = f"{'benchmark':<28}{'ops/s':>12}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'peak KB':>10}"
+    if baseline: head += f"{'Δp50':>9}{'Δops/s':>9}"
+    print(head)
+    print("-" * len(head))
+    for name, r in results.items():
+        line = f"{name:<28}{r['ops_per_sec']:>12}{r['p50_ms']:>11}{r['p95_ms']:>11}{r['p99_ms']:>11}{r['peak_py_kb']:>10}"
+        b = (baseline or {}).get(name)
+        if b:
+            line += f"{_delta(r['p50_ms'], b['p50_ms']):>9}{_delta(r['ops_per_sec'], b['ops_per_sec']):>9}"
+        print(line)
+
+
+def _delta(new, old):
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+
+def regressions(results, baseline, threshold):
+    return [name for name, r in results.items()
+            if name in baseline and baseline[name]["p50_ms"] and r["p50_ms"] > baseline[name]["p50_ms"] * (1 + threshold)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for parsing, formatting and rendering hot paths.")
+    parser.add_argument("--only", help="comma-separated benchmark names")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply default iteration counts")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="p50 slowdown counted as regression (default 0.15)")
+    args = parser.parse_args(argv)
+
+    messages, pairs, logo, header = load_fixtures()
+    stub_network(logo, header)
+    only = set(args.only.split(",")) if args.only else None
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    contracts.log_success = contracts.log_info = lambda msg: None     # print maliyeti ölçüme karışmasın
+
+    results = {}
+    try:
+        for name, fn, args_list, is_async, iterations in build_cases(messages, pairs):
+            if only and name not in only: continue
+            results[name] = run_case(loop, fn, args_list, max(1, int(iterations * args.scale)), is_async)
+    finally:
+        contracts.image_cache.flush()
+        loop.run_until_complete(contracts.close_http_session())
+        contracts.render_pool.shutdown()
+        loop.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: baseline = json.load(f)
+    print_table(results, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f: json.dump(results, f, indent=2)
+    if baseline:
+        slow = regressions(results, baseline, args.threshold)
+        if slow:
+            print(f"Regressions (p50 > +{args.threshold:.0%}): {', '.join(slow)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,145 @@
 import os
 import re
+import sys
+import socket
+import json
+import gzip
+import time
+import hashlib
+import bisect
+import math
+import heapq
 import random
+import signal
 import asyncio
-import requests
+import itertools
+import aiohttp
+import threading
+import multiprocessing
+import contextlib
+import contextvars
 from io import BytesIO
+from email.utils import parsedate_to_datetime
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from aiohttp import web
 from PIL import Image, ImageDraw, ImageFont
-from telethon import TelegramClient, events
+from telethon import TelegramClient, events, errors
 from telethon.sessions import StringSession
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
 
 def log_success(msg): print(f"\033[92m✅ {msg}\033[0m", flush=True)
 def log_error(msg):   print(f"\033[91m❌ {msg}\033[0m", flush=True)
 def log_info(msg):    print(f"\033[94mℹ️ {msg}\033[0m", flush=True)
 
-api_id = int(os.environ["API_ID"])
-api_hash = os.environ["API_HASH"]
-session_string = os.environ["SESSION_STRING"]
+# Kimlik bilgileri sadece bot başlarken gerekli; modül benchmark/test için onlarsız import edilebilir
+api_id = int(os.environ.get("API_ID") or 0)
+api_hash = os.environ.get("API_HASH", "")
+session_string = os.environ.get("SESSION_STRING", "")
 
 TARGET_CHANNEL_ID = "@lapad_announcement"
 BANNER_PATH = "banner.jpg"
 FONTS_DIR = "fonts"
 FALLBACK_LOGO = "lapadtrending.png"
 
+DEXSCREENER_API = os.environ.get("DEXSCREENER_API", "https://api.dexscreener.com")
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "20"))
+DEX_TIMEOUT = float(os.environ.get("DEX_TIMEOUT", "12"))
+DEX_BATCH_SIZE = 30     # /latest/dex/tokens/ en fazla 30 adres kabul ediyor
+DEX_MAX_PATH = 1800
+DEX_RATE = float(os.environ.get("DEX_RATE", "4"))              # başlangıç istek/sn
+DEX_RATE_MIN = float(os.environ.get("DEX_RATE_MIN", "0.5"))
+DEX_RATE_MAX = float(os.environ.get("DEX_RATE_MAX", "5"))      # DexScreener: ~300 istek/dk
+DEX_CONCURRENCY = int(os.environ.get("DEX_CONCURRENCY", "8"))
+DEX_LATENCY_TARGET = float(os.environ.get("DEX_LATENCY_TARGET", "2.0"))
+PRIORITY_REALTIME, PRIORITY_BULK = 0, 1
+
+REDIS_URL = os.environ.get("REDIS_URL")
+TOKEN_CACHE_TTL = float(os.environ.get("TOKEN_CACHE_TTL", "120"))
+TOKEN_CACHE_NEGATIVE_TTL = float(os.environ.get("TOKEN_CACHE_NEGATIVE_TTL", "30"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", "5000"))
+TOKEN_CACHE_MAX_BYTES = int(os.environ.get("TOKEN_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(".cache", "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", str(8 * 1024 * 1024)))     # indirme üst sınırı
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", str(36_000_000)))        # decode öncesi piksel sınırı
+HEADER_MAX_SIDE = int(os.environ.get("HEADER_MAX_SIDE", "2560"))
+IMAGE_CACHE_FRESH = float(os.environ.get("IMAGE_CACHE_FRESH", "3600"))   # bu süreden sonra ETag/Last-Modified ile revalidate
+IMAGE_INDEX_FLUSH = float(os.environ.get("IMAGE_INDEX_FLUSH", "5"))       # index.json en fazla bu aralıkla yazılır
+
+STATE_DIR = os.environ.get("STATE_DIR", ".state")
+STATE_FLUSH = float(os.environ.get("STATE_FLUSH", "5"))       # posted/contract index dosyaları en fazla bu aralıkla yazılır
+CONTRACT_INDEX_PATH = os.path.join(STATE_DIR, "contract_index.json")
+CONTRACT_WINDOW = float(os.environ.get("CONTRACT_WINDOW", str(3 * 24 * 3600)))
+CONTRACT_INDEX_MAX = int(os.environ.get("CONTRACT_INDEX_MAX", "1000"))
+CONTRACT_SCAN_MAX = int(os.environ.get("CONTRACT_SCAN_MAX", "1000"))   # tek seferde okunacak en fazla yeni mesaj
+TREND_MARKER = "Worldwide Top #Trends Diamonds Now"
+POSTED_PATH = os.path.join(STATE_DIR, "posted.json")
+POSTED_COOLDOWN = float(os.environ.get("POSTED_COOLDOWN", str(6 * 3600)))
+POSTED_MAX = int(os.environ.get("POSTED_MAX", "10000"))
+SNAPSHOT_PATH = os.path.join(STATE_DIR, "snapshot.json.gz")
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", "300"))
+
+TREND_TOP_K = 8
+TREND_TTL = float(os.environ.get("TREND_TTL", "3600"))                    # bu süre güncellenmeyen token listeden düşer
+TREND_HALF_LIFE = float(os.environ.get("TREND_HALF_LIFE", "0"))           # >0 ise skor yaşla birlikte yarılanır
+TREND_REFRESH_INTERVAL = float(os.environ.get("TREND_REFRESH_INTERVAL", "600"))
+TRENDS_POST_INTERVAL = float(os.environ.get("TRENDS_POST_INTERVAL", "1800"))
+
+MEDIA_HANDLE_TTL = float(os.environ.get("MEDIA_HANDLE_TTL", "3600"))   # upload edilen parçalar sunucuda sınırlı süre tutuluyor
+MEDIA_HANDLE_MAX = int(os.environ.get("MEDIA_HANDLE_MAX", "256"))
+TRENDS_EDIT_IN_PLACE = os.environ.get("TRENDS_EDIT_IN_PLACE", "0") == "1"
+DESTINATIONS = [d.strip() for d in os.environ.get("DESTINATIONS", TARGET_CHANNEL_ID).split(",") if d.strip()]
+DESTINATION_MIN_INTERVAL = float(os.environ.get("DESTINATION_MIN_INTERVAL", "3"))   # aynı hedefe iki gönderim arası en az
+FLOOD_WAIT_MAX = float(os.environ.get("FLOOD_WAIT_MAX", "300"))                    # bundan uzun flood-wait beklenmez
+
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "4"))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "100"))
+
+BOT_MODE = os.environ.get("BOT_MODE", "single")     # single | ingest | worker (argv[1] öncelikli)
+JOB_STREAM = os.environ.get("JOB_STREAM", "lapad:jobs")
+JOB_GROUP = os.environ.get("JOB_GROUP", "lapad:workers")
+JOB_DEAD_STREAM = os.environ.get("JOB_DEAD_STREAM", "lapad:jobs:dead")
+JOB_STREAM_MAX = int(os.environ.get("JOB_STREAM_MAX", "10000"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_CLAIM_IDLE = float(os.environ.get("JOB_CLAIM_IDLE", "120"))    # bu kadar ack'lenmeyen iş başka worker'a geçer
+JOB_DEDUP_TTL = float(os.environ.get("JOB_DEDUP_TTL", "60"))       # aynı contract bu süre içinde tekrar kuyruğa girmez
+LEADER_KEY = os.environ.get("LEADER_KEY", "lapad:leader")
+TREND_SHARED_KEY = os.environ.get("TREND_SHARED_KEY", "lapad:trends")     # worker'ların canlı trend kayıtları
+LEADER_TTL = float(os.environ.get("LEADER_TTL", "30"))
+INSTANCE_ID = os.environ.get("INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+RENDER_POOL = os.environ.get("RENDER_POOL", "process")     # process | thread
+MEDIA_DEADLINE = float(os.environ.get("MEDIA_DEADLINE", "12"))   # header/banner hazırlığı için toplam süre
+MEDIA_HEADER_GRACE = float(os.environ.get("MEDIA_HEADER_GRACE", "1.5"))   # banner hazırken header için ek bekleme
+BANNER_ENCODING = {
+    "format": os.environ.get("BANNER_FORMAT", "PNG").upper(),          # PNG | JPEG
+    "quality": int(os.environ.get("BANNER_QUALITY", "88")),
+    "subsampling": os.environ.get("BANNER_SUBSAMPLING", "4:2:0"),      # JPEG: 4:4:4 | 4:2:2 | 4:2:0
+    "max_side": int(os.environ.get("BANNER_MAX_SIDE", "0")),           # 0 = sadece Telegram limitleri
+    "optimize": os.environ.get("BANNER_OPTIMIZE", "0") == "1",
+}
+# Header fotoğraf; limitler içindeyse orijinal bytes gider, küçültülürse bu formatta encode edilir
+HEADER_ENCODING = {"format": os.environ.get("HEADER_FORMAT", "JPEG").upper()}
+# Telethon sadece .png/.jpg dosyalarını foto olarak gönderir; WEBP gibi formatlar sticker/dosya olarak gider
+PHOTO_FORMATS = ("PNG", "JPEG")
+for _var, _fmt in (("BANNER_FORMAT", BANNER_ENCODING["format"]), ("HEADER_FORMAT", HEADER_ENCODING["format"])):
+    if _fmt not in PHOTO_FORMATS: raise ValueError(f"{_var}={_fmt} is not sent as a Telegram photo; use PNG or JPEG")
+TELEGRAM_PHOTO_MAX_SUM = 10000      # Telegram foto: genişlik + yükseklik <= 10000, oran <= 20
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))             # >0 ise /metrics bu portta açılır
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROFILE_SLOW = float(os.environ.get("PROFILE_SLOW", "0"))           # >0 ise bu süreyi aşan işlerin stack örnekleri yazılır
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.path.join(STATE_DIR, "profiles")
+
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
@@ -47,7 +166,7 @@ CHANNEL_PARSERS = {
     -1001873505928: "parse_trending_scrape",
 }
 
-client = TelegramClient(StringSession(session_string), api_id, api_hash)
+client = None
 TREND_MSG_ID = None
 
 def human_format(num):
@@ -60,59 +179,625 @@ def human_format(num):
     except Exception:
         return str(num)
 
+metric_source = contextvars.ContextVar("metric_source", default="-")   # kaynak kanal id'si veya "worldwide"
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in items) + "}"
+
+class Metrics:
+    # Prometheus text formatında counter + histogram; bileşenlerin stats() dict'leri scrape anında gauge olur
+    def __init__(self, prefix="lapad"):
+        self.prefix = prefix
+        self.counters = {}      # (isim, label'lar) -> değer
+        self.histograms = {}    # (isim, label'lar) -> Histogram
+        self.collectors = []    # (isim, stats fonksiyonu, üst seviye anahtarların label adı)
+
+    def _key(self, name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        hist = self.histograms.get(key)
+        if hist is None: hist = self.histograms[key] = Histogram()
+        hist.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, stage, **labels):
+        # Aşama süresi; kaynak label'ı verilmezse context'ten (pipeline işi / Worldwide döngüsü) gelir
+        labels.setdefault("source", metric_source.get())
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - started, stage=stage, **labels)
+
+    def register(self, name, stats, label=None):
+        self.collectors.append((name, stats, label))
+
+    def render(self):
+        lines = []
+        for name in sorted({n for n, _ in self.counters}):
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full} counter")
+            lines += [f"{full}{_labels(l)} {v}" for (n, l), v in sorted(self.counters.items()) if n == name]
+        for name in sorted({n for n, _ in self.histograms}):
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full} histogram")
+            for (n, l), hist in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                if n != name: continue
+                total = 0
+                for le, c in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                    total += c
+                    lines.append(f"{full}_bucket{_labels(l, [('le', le)])} {total}")
+                lines.append(f"{full}_sum{_labels(l)} {hist.sum:.6f}")
+                lines.append(f"{full}_count{_labels(l)} {hist.count}")
+        for name, stats, label in self.collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                log_error(f"Metrics collector {name} failed: {e!r}")
+                continue
+            gauges = {}
+            for key, row in (values.items() if label else [(None, values)]):
+                for k, v in row.items():
+                    if isinstance(v, bool) or not isinstance(v, (int, float)): continue
+                    gauges.setdefault(k, []).append(([(label, key)] if label else [], v))
+            for k, samples in gauges.items():
+                full = f"{self.prefix}_{name}_{k}"
+                lines.append(f"# TYPE {full} gauge")
+                lines += [f"{full}{_labels(l)} {v}" for l, v in samples]
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    async def scrape(request):
+        return web.Response(body=metrics.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+    app = web.Application()
+    app.router.add_get("/metrics", scrape)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log_success(f"Metrics: http://{host}:{port}/metrics")
+    return runner
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+class SlowProfiler:
+    # Event loop thread'ini arka planda örnekler; PROFILE_SLOW'u aşan bir iş bitince o aralıktaki örnekler
+    # collapsed-stack (flamegraph) olarak hook'lara verilir. Loop ortak olduğu için eşzamanlı işler de görünür.
+    def __init__(self, threshold=PROFILE_SLOW, interval=PROFILE_INTERVAL, out_dir=PROFILE_DIR, keep=120.0):
+        self.threshold = threshold
+        self.interval = interval
+        self.out_dir = out_dir
+        self.samples = deque(maxlen=max(1000, int(keep / max(interval, 0.001))))
+        self.hooks = [self.write]     # hook(label, süre, Counter(stack -> örnek sayısı))
+        self.dumps = 0
+        self._target = None
+        self._thread = None
+
+    def start(self):
+        if self.threshold <= 0 or self._thread is not None: return
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="slow-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = sys._current_frames().get(self._target)
+            if frame is not None: self.samples.append((time.monotonic(), _collapse(frame)))
+            del frame
+            time.sleep(self.interval)
+
+    def check(self, label, started):
+        # started: time.monotonic() iş başlangıcı
+        ended = time.monotonic()
+        if self._thread is None or ended - started < self.threshold: return
+        stacks = Counter(stack for t, stack in list(self.samples) if started <= t <= ended)
+        metrics.inc("slow_requests_total", kind=label.split(":", 1)[0])
+        for hook in self.hooks:
+            try:
+                hook(label, ended - started, stacks)
+            except Exception as e:
+                log_error(f"Profiler hook error: {e!r}")
+
+    def write(self, label, duration, stacks):
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{int(time.time())}_{re.sub(r'[^A-Za-z0-9_-]+', '_', label)[:60]}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common(): f.write(f"{stack} {count}\n")
+        self.dumps += 1
+        log_info(f"Slow {label}: {duration:.2f}s, {sum(stacks.values())} samples -> {path}")
+
+profiler = SlowProfiler()
+
+# Tek geçişte EVM (0x + 40 hex) ve Solana tarzı base58 (32-44 karakter) adaylar
+CONTRACT_RE = re.compile(r"(?<![A-Za-z0-9])(?:0x[0-9a-fA-F]{40}|[1-9A-HJ-NP-Za-km-z]{32,44})(?![A-Za-z0-9])")
+URL_RE = re.compile(r"https?://[^\s]+")
+SCAN_URL_HOSTS = ("solscan.io", "etherscan.io", "dexscreener.com", "dexview.com", "x.com", "twitter.com")
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_BASE58_INDEX = {c: i for i, c in enumerate(BASE58_ALPHABET)}
+
+_KECCAK_ROT = [0, 1, 62, 28, 27, 36, 44, 6, 55, 20, 3, 10, 43, 25, 39, 41, 45, 15, 21, 8, 18, 2, 61, 56, 14]
+_M64 = (1 << 64) - 1
+
+def _keccak_rc():
+    rcs, r = [], 1
+    for _ in range(24):
+        rc = 0
+        for j in range(7):
+            r = ((r << 1) ^ ((r >> 7) * 0x71)) % 256
+            if r & 2: rc ^= 1 << ((1 << j) - 1)
+        rcs.append(rc)
+    return rcs
+
+_KECCAK_RC = _keccak_rc()
+
+def _keccak_f(a):
+    rol = lambda v, n: ((v << n) | (v >> (64 - n))) & _M64 if n else v
+    for rc in _KECCAK_RC:
+        c = [a[x] ^ a[x + 5] ^ a[x + 10] ^ a[x + 15] ^ a[x + 20] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ rol(c[(x + 1) % 5], 1) for x in range(5)]
+        a = [a[i] ^ d[i % 5] for i in range(25)]
+        b = [0] * 25
+        for x in range(5):
+            for y in range(5):
+                b[y + 5 * ((2 * x + 3 * y) % 5)] = rol(a[x + 5 * y], _KECCAK_ROT[x + 5 * y])
+        a = [b[i] ^ (~b[(i + 1) % 5 + i - i % 5] & b[(i + 2) % 5 + i - i % 5]) for i in range(25)]
+        a[0] ^= rc
+    return a
+
+def keccak256(data):
+    rate = 136
+    pad = rate - len(data) % rate
+    data = bytearray(data) + bytes(pad)
+    data[-pad] ^= 0x01; data[-1] ^= 0x80
+    a = [0] * 25
+    for off in range(0, len(data), rate):
+        for i in range(rate // 8):
+            a[i] ^= int.from_bytes(data[off + 8 * i: off + 8 * i + 8], "little")
+        a = _keccak_f(a)
+    return b"".join(v.to_bytes(8, "little") for v in a[:4])
+
+def is_valid_evm_address(address):
+    body = address[2:]
+    if int(body, 16) == 0: return False
+    if body.islower() or body.isupper() or body.isdigit(): return True
+    # Karışık harf: EIP-55 checksum
+    digest = keccak256(body.lower().encode()).hex()
+    return all(c == (c.upper() if int(digest[i], 16) >= 8 else c.lower()) for i, c in enumerate(body))
+
+def is_valid_base58_address(address):
+    n = 0
+    for c in address: n = n * 58 + _BASE58_INDEX[c]
+    zeros = len(address) - len(address.lstrip("1"))
+    return zeros + (n.bit_length() + 7) // 8 == 32
+
+def scan_contracts(text):
+    if not text or len(text) < 32: return []
+    found, keys = [], set()
+    for m in CONTRACT_RE.finditer(text):
+        c = m.group(0)
+        key = _addr_key(c)
+        if key in keys: continue
+        keys.add(key)
+        if is_valid_evm_address(c) if c.startswith("0x") else is_valid_base58_address(c):
+            found.append(c)
+    return found
+
 def extract_contract_candidates(text):
-    evm_regex = r"0x[a-fA-F0-9]{40}"
-    general_regex = r"\b[a-zA-Z0-9]{32,}\b"
-    evm_matches = re.findall(evm_regex, text)
-    general_matches = [m for m in re.findall(general_regex, text) if not m.startswith("0x")]
-    return evm_matches + general_matches
+    return scan_contracts(text)
 
 def extract_token_from_url(url):
-    m = re.search(r"(0x[a-fA-F0-9]{40})|([A-Za-z0-9]{32,45})", url)
-    return m.group(0) if m else None
+    found = scan_contracts(url)
+    return found[0] if found else None
 
-def parse_cmclistingstg(text):
+def _listing_window(text):
+    # "CA"/"Contract" satırı ve sonraki 3 satır
     lines = text.strip().splitlines()
-    contracts = []
     for i, line in enumerate(lines):
         if "CA" in line or "Contract" in line:
-            contracts += extract_contract_candidates(line)
-            for j in range(1, 4):
-                if i + j < len(lines): contracts += extract_contract_candidates(lines[i + j])
-            break
-    return list(set(contracts))
+            return "\n".join(lines[i:i + 4])
+    return ""
+
+def _scan_urls(event):
+    # Entity URL'leri + metindeki URL'ler; sadece explorer/dexscreener/x linkleri taranır
+    urls = [e.url for e in event.message.entities or [] if getattr(e, "url", None)]
+    urls += URL_RE.findall(event.message.message or "")
+    return [u for u in urls if any(host in u for host in SCAN_URL_HOSTS)]
+
+def parse_cmclistingstg(text):
+    return scan_contracts(_listing_window(text))
 
 def parse_trending_scrape(event):
-    contracts, urls = [], []
-    if event.message.entities:
-        for entity in event.message.entities:
-            if hasattr(entity, "url") and entity.url: urls.append(entity.url)
-    urls += re.findall(r"(https?://[^\s]+)", event.message.message or "")
-    for url in urls:
-        if any(x in url for x in ["solscan.io", "etherscan.io", "dexscreener.com", "dexview.com", "x.com", "twitter.com"]):
-            tok = extract_token_from_url(url)
-            if tok: contracts.append(tok); break
-    return list(set(contracts))
+    # İlk contract içeren link; tüm linkler tek metinde, tek tarama
+    return scan_contracts("\n".join(_scan_urls(event)))[:1]
 
 def parse_combo_parser(event):
     text = event.message.message or ""
-    return list(set(parse_cmclistingstg(text) + parse_trending_scrape(event)))
+    return scan_contracts("\n".join([_listing_window(text)] + _scan_urls(event)))
+
+_http = None
+
+def http_session():
+    # Tek bir pool: keep-alive + DNS cache, tüm HTTP trafiği bunu paylaşır
+    global _http
+    if _http is None or _http.closed:
+        connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, ttl_dns_cache=300, keepalive_timeout=60)
+        _http = aiohttp.ClientSession(connector=connector)
+    return _http
+
+async def close_http_session():
+    global _http
+    if _http is not None and not _http.closed:
+        await _http.close()
+    _http = None
+
+async def fetch_bytes(url, timeout=10, image_only=False, max_bytes=IMAGE_MAX_BYTES):
+    data, _ = await fetch_conditional(url, timeout=timeout, image_only=image_only, max_bytes=max_bytes)
+    return data
+
+async def fetch_conditional(url, timeout=10, image_only=False, etag=None, last_modified=None, max_bytes=IMAGE_MAX_BYTES):
+    # (data, validators) döner; 304 ise data=b"". Gövde parça parça okunur, max_bytes aşılırsa bırakılır.
+    headers = {"User-Agent": random.choice(USER_AGENTS)}
+    if etag: headers["If-None-Match"] = etag
+    if last_modified: headers["If-Modified-Since"] = last_modified
+    try:
+        async with http_session().get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+            validators = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+            if r.status == 304 and (etag or last_modified):
+                return b"", validators
+            ctype = (r.headers.get("Content-Type") or "").lower()
+            if r.status != 200 or (image_only and "image" not in ctype):
+                log_error(f"Fetch invalid: status={r.status}, ctype={ctype}, url={url}")
+                return None, None
+            if max_bytes and (r.content_length or 0) > max_bytes:
+                log_error(f"Fetch too large: {r.content_length} bytes, url={url}")
+                return None, None
+            body = bytearray()
+            async for chunk in r.content.iter_chunked(64 * 1024):
+                body += chunk
+                if max_bytes and len(body) > max_bytes:
+                    log_error(f"Fetch too large: >{max_bytes} bytes, url={url}")
+                    return None, None
+            return (bytes(body) or None), validators
+    except Exception as e:
+        log_error(f"Fetch failed: {e!r}, url={url}")
+        return None, None
 
-def fetch_token_info(token_address, retries=3):
-    url = f"https://api.dexscreener.com/latest/dex/search/?q={token_address}"
-    for attempt in range(retries):
-        headers = {"User-Agent": random.choice(USER_AGENTS)}
+def _retry_after(value):
+    if not value: return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+class RateLimiter:
+    # Token bucket + eşzamanlılık sınırı; sıra önceliğe göre (küçük = önce).
+    # 429'da hız yarıya iner, Retry-After kadar durur; başarılı ve hızlı cevaplarda yavaşça artar.
+    def __init__(self, rate=DEX_RATE, min_rate=DEX_RATE_MIN, max_rate=DEX_RATE_MAX,
+                 concurrency=DEX_CONCURRENCY, latency_target=DEX_LATENCY_TARGET, burst=None):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.latency_target = latency_target
+        self.burst = burst or max(1.0, max_rate)
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._queue = []
+        self._seq = itertools.count()
+        self._changed = None
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _notify(self):
+        if self._changed is not None: self._changed.set()
+        self._changed = None
+
+    async def _wait(self, timeout):
+        if self._changed is None: self._changed = asyncio.Event()
         try:
-            r = requests.get(url, headers=headers, timeout=12)
-            if r.status_code == 200:
-                return r.json().get("pairs", [])
-            else:
-                log_error(f"Dexscreener bad status {r.status_code}, retry {attempt+1}/{retries}")
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def acquire(self, priority=PRIORITY_BULK, timeout=None):
+        entry = (priority, next(self._seq))
+        heapq.heappush(self._queue, entry)
+        give_up = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                now = time.monotonic()
+                wait = None
+                if self._queue[0] == entry and self.in_flight < self.concurrency:
+                    self._refill(now)
+                    wait = max(self._paused_until - now, (1.0 - self.tokens) / self.rate)
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        self.tokens -= 1.0
+                        self.in_flight += 1
+                        self._notify()
+                        return True
+                if give_up is not None:
+                    if now >= give_up: raise asyncio.TimeoutError
+                    wait = give_up - now if wait is None else min(wait, give_up - now)
+                await self._wait(wait)
+        except BaseException:
+            if entry in self._queue:
+                self._queue.remove(entry); heapq.heapify(self._queue)
+                self._notify()
+            raise
+
+    def release(self, status=None, latency=None, retry_after=None):
+        self.in_flight -= 1
+        if status == 429:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            log_error(f"Dexscreener 429: rate -> {self.rate:.2f}/s, pause {pause:.1f}s")
+        elif status == 200 and latency is not None:
+            if latency > self.latency_target: self.rate = max(self.min_rate, self.rate * 0.9)
+            else: self.rate = min(self.max_rate, self.rate + self.max_rate * 0.02)
+        self._notify()
+
+    def stats(self):
+        return {"rate": round(self.rate, 2), "in_flight": self.in_flight, "queued": len(self._queue), "throttled": self.throttled}
+
+dex_limiter = RateLimiter()
+
+class DexClient:
+    def __init__(self, base_url=DEXSCREENER_API, timeout=DEX_TIMEOUT, retries=3, limiter=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.limiter = limiter or dex_limiter
+
+    async def get_json(self, path, retries=None, deadline=None, priority=PRIORITY_BULK):
+        retries = retries or self.retries
+        url = f"{self.base_url}{path}"
+        loop = asyncio.get_running_loop()
+        for attempt in range(retries):
+            wait = None if deadline is None else deadline - loop.time()
+            try:
+                await self.limiter.acquire(priority, timeout=wait)
+            except asyncio.TimeoutError:
+                metrics.inc("dexscreener_deadline_exceeded_total")
+                log_error(f"Dexscreener deadline exceeded: {path}")
+                return None
+            timeout = self.timeout
+            if deadline is not None: timeout = max(0.1, min(timeout, deadline - loop.time()))
+            headers = {"User-Agent": random.choice(USER_AGENTS)}
+            status, retry_after, started = None, None, loop.time()
+            if attempt: metrics.inc("dexscreener_retries_total")
+            try:
+                async with http_session().get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+                    status = r.status
+                    if r.status == 200:
+                        return await r.json(content_type=None)
+                    retry_after = _retry_after(r.headers.get("Retry-After"))
+                    log_error(f"Dexscreener bad status {r.status}, retry {attempt+1}/{retries}")
+            except Exception as e:
+                log_error(f"Dexscreener API error: {e!r}, retry {attempt+1}/{retries}")
+            finally:
+                self.limiter.release(status, loop.time() - started, retry_after)
+                metrics.inc("dexscreener_requests_total", status=status or "error")
+                metrics.observe("dexscreener_request_seconds", loop.time() - started, priority=priority)
+            if attempt + 1 < retries and status != 429:
+                # 429 beklemesini limiter yapıyor; diğer hatalarda küçük bir backoff
+                await asyncio.sleep(random.uniform(0.5, 1.5) * (attempt + 1))
+        return None
+
+    async def search(self, query, **kw):
+        data = await self.get_json(f"/latest/dex/search/?q={query}", **kw)
+        if data is None: return None
+        return data.get("pairs") or []
+
+    def _batches(self, addresses):
+        batch, length = [], 0
+        for a in addresses:
+            if batch and (len(batch) >= DEX_BATCH_SIZE or length + len(a) + 1 > DEX_MAX_PATH):
+                yield batch
+                batch, length = [], 0
+            batch.append(a); length += len(a) + 1
+        if batch: yield batch
+
+    async def tokens(self, addresses, **kw):
+        # Çoklu adres: her istekte 30 adrese kadar, sonuçlar istenen adrese geri eşlenir
+        wanted = {}
+        for a in addresses:
+            wanted.setdefault(_addr_key(a), a)
+        batches = list(self._batches(list(wanted.values())))
+        results = await asyncio.gather(*(self.get_json(f"/latest/dex/tokens/{','.join(b)}", **kw) for b in batches))
+        out = {}
+        for batch, data in zip(batches, results):
+            if data is None: continue
+            for a in batch: out.setdefault(a, [])
+            for pair in data.get("pairs") or []:
+                for side in ("baseToken", "quoteToken"):
+                    a = wanted.get(_addr_key((pair.get(side) or {}).get("address") or ""))
+                    if a in out:
+                        out[a].append(pair)
+                        break
+        return out
+
+def _addr_key(address):
+    return address.lower() if address[:2].lower() == "0x" else address
+
+dex = DexClient()
+
+_MISS = object()
+
+class MemoryCacheBackend:
+    def __init__(self, max_entries=TOKEN_CACHE_MAX_ENTRIES, max_bytes=TOKEN_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data = OrderedDict()      # key -> (expires_at, size, value)
+
+    def __len__(self): return len(self._data)
+
+    async def get(self, key):
+        item = self._data.get(key)
+        if item is None: return _MISS
+        if item[0] <= time.time():
+            self._drop(key)
+            return _MISS
+        self._data.move_to_end(key)
+        return item[2]
+
+    async def set(self, key, value, ttl, size=None):
+        self._put(key, value, time.time() + ttl, size)
+
+    def _put(self, key, value, expires_at, size=None):
+        if size is None: size = len(json.dumps(value, separators=(",", ":")))
+        if key in self._data: self._drop(key)
+        if size > self.max_bytes: return
+        self._data[key] = (expires_at, size, value)
+        self.bytes += size
+        while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+            self._drop(next(iter(self._data)))
+
+    def _drop(self, key):
+        self.bytes -= self._data.pop(key)[1]
+
+    def dump(self):
+        # LRU sırasıyla [key, expires_at, value]; süresi dolanlar yazılmaz
+        now = time.time()
+        return [[key, exp, value] for key, (exp, _, value) in self._data.items() if exp > now]
+
+    def restore(self, rows):
+        now = time.time()
+        for key, exp, value in rows:
+            if exp > now: self._put(key, value, exp)
+
+_redis_clients = {}
+
+def get_redis(url=REDIS_URL):
+    if aioredis is None: raise RuntimeError("redis package is not installed")
+    if url not in _redis_clients: _redis_clients[url] = aioredis.from_url(url)
+    return _redis_clients[url]
+
+class RedisCacheBackend:
+    def __init__(self, url=REDIS_URL, prefix="lapad:pairs:"):
+        self.redis = get_redis(url)
+        self.prefix = prefix
+
+    async def get(self, key):
+        try:
+            raw = await self.redis.get(self.prefix + key)
+        except Exception as e:
+            log_error(f"Redis cache get error: {e}")
+            return _MISS
+        return _MISS if raw is None else json.loads(raw)
+
+    async def set(self, key, value, ttl, size=None):
+        try:
+            await self.redis.set(self.prefix + key, json.dumps(value, separators=(",", ":")), px=max(1, int(ttl * 1000)))
         except Exception as e:
-            log_error(f"Dexscreener API error: {e}, retry {attempt+1}/{retries}")
-        # küçük bir delay bırak (rate-limit yememek için)
-        asyncio.sleep(random.uniform(1.0, 2.5))
-    return None
+            log_error(f"Redis cache set error: {e}")
+
+class TokenCache:
+    # Taze veri TTL kadar, "pair yok" sonucu daha kısa süre tutulur
+    def __init__(self, local=None, shared=None, ttl=TOKEN_CACHE_TTL, negative_ttl=TOKEN_CACHE_NEGATIVE_TTL):
+        self.local = local if local is not None else MemoryCacheBackend()
+        self.shared = shared
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = self.misses = self.negative_hits = 0
+
+    async def get(self, address):
+        key = _addr_key(address)
+        pairs = await self.local.get(key)
+        if pairs is _MISS and self.shared is not None:
+            pairs = await self.shared.get(key)
+            if pairs is not _MISS:
+                await self.local.set(key, pairs, self.ttl if pairs else self.negative_ttl)
+        if pairs is _MISS:
+            self.misses += 1
+            return _MISS
+        self.hits += 1
+        if not pairs: self.negative_hits += 1
+        return pairs
+
+    async def put(self, address, pairs):
+        if pairs is None: return      # hata sonucu cache'lenmez
+        key, ttl = _addr_key(address), (self.ttl if pairs else self.negative_ttl)
+        await self.local.set(key, pairs, ttl)
+        if self.shared is not None:
+            await self.shared.set(key, pairs, ttl)
+
+    def dump(self):
+        return self.local.dump()
+
+    def restore(self, rows):
+        self.local.restore(rows)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "negative_hits": self.negative_hits,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self.local), "bytes": self.local.bytes,
+        }
+
+token_cache = TokenCache(shared=RedisCacheBackend() if REDIS_URL else None)
+
+async def fetch_token_info(token_address, retries=3, deadline=None, priority=PRIORITY_REALTIME):
+    pairs = await token_cache.get(token_address)
+    if pairs is not _MISS: return pairs
+    pairs = await dex.search(token_address, retries=retries, deadline=deadline, priority=priority)
+    await token_cache.put(token_address, pairs)
+    return pairs
+
+async def fetch_tokens_info(addresses, retries=3, deadline=None, priority=PRIORITY_BULK):
+    out, missing = {}, []
+    for a in addresses:
+        pairs = await token_cache.get(a)
+        if pairs is _MISS: missing.append(a)
+        else: out[a] = pairs
+    if missing:
+        fetched = await dex.tokens(missing, retries=retries, deadline=deadline, priority=priority)
+        for a, pairs in fetched.items():
+            await token_cache.put(a, pairs)
+            out[a] = pairs
+    return out
 
 def parse_social_links(pair_info):
     info = pair_info.get("info", {}) or {}
@@ -177,33 +862,274 @@ def load_fonts():
         log_error(f"Font load failed: {e}, fallback.")
         d = ImageFont.load_default()
         return d, d, d, d, d, d
-def generate_image_banner(token_name, symbol, chain, contract, logo_url, website_url, change, change_interval):
+def _circle_mask(size):
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
+    return mask
+
+def _gold_border(logo_size):
+    border_size = logo_size + 20
+    border = Image.new("RGBA", (border_size, border_size), (0, 0, 0, 0))
+    border_draw = ImageDraw.Draw(border)
+    for i in range(10):
+        color = (255, 215 - i*10, 0 + i*20, 255)
+        border_draw.ellipse((i, i, border_size - i, border_size - i), outline=color, width=4)
+    return border
+
+def _logo_ring(size, gold):
+    ring = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    d = ImageDraw.Draw(ring)
+    if gold:
+        d.ellipse((2, 2, size - 2, size - 2), outline=(255, 215, 0, 255), width=6)
+        d.ellipse((6, 6, size - 6, size - 6), outline=(255, 235, 120, 255), width=3)
+    else:
+        d.ellipse((2, 2, size - 2, size - 2), outline=(255, 255, 255, 255), width=4)
+    return ring
+
+LOGO_SIZE = 300
+SIZE_BIG, SIZE_SMALL = 132, 108
+
+class RenderContext:
+    # Banner, fontlar, maskeler ve altın çerçeve bir kere yüklenir; her render kopya ile çalışır
+    def __init__(self, banner_path=BANNER_PATH):
+        self.banner = Image.open(banner_path).convert("RGBA") if os.path.exists(banner_path) else None
+        self.fonts = load_fonts()
+        self.masks = {size: _circle_mask(size) for size in (LOGO_SIZE, SIZE_BIG, SIZE_SMALL)}
+        self.border = _gold_border(LOGO_SIZE)
+        self.rings = {(SIZE_BIG, True): _logo_ring(SIZE_BIG, True), (SIZE_SMALL, False): _logo_ring(SIZE_SMALL, False)}
+        self.fallback_logo = Image.open(FALLBACK_LOGO).convert("RGBA") if os.path.exists(FALLBACK_LOGO) else None
+        self._fallbacks = {}
+
+    def base_banner(self):
+        return self.banner.copy() if self.banner is not None else None
+
+    def mask(self, size):
+        if size not in self.masks: self.masks[size] = _circle_mask(size)
+        return self.masks[size]
+
+    def ring(self, size, gold):
+        if (size, gold) not in self.rings: self.rings[(size, gold)] = _logo_ring(size, gold)
+        return self.rings[(size, gold)]
+
+    def fallback(self, size):
+        if size not in self._fallbacks:
+            if self.fallback_logo is None: self._fallbacks[size] = Image.new("RGBA", (size, size), (80, 80, 100, 255))
+            else: self._fallbacks[size] = self.fallback_logo.resize((size, size))
+        return self._fallbacks[size]
+
+_render_local = threading.local()
+
+def get_render_context():
+    # Font nesneleri thread-safe değil: her thread/process kendi context'ini tutar
+    ctx = getattr(_render_local, "ctx", None)
+    if ctx is None: ctx = _render_local.ctx = RenderContext()
+    return ctx
+
+class ImageCache:
+    # URL -> içerik hash'i index'i; blob'lar hash ile saklanır, logo varyantları boyut başına
+    def __init__(self, root=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES, fresh_for=IMAGE_CACHE_FRESH, flush_delay=IMAGE_INDEX_FLUSH):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self.flush_delay = flush_delay
+        self.hits = self.misses = self.revalidated = 0
+        self._index_path = os.path.join(root, "index.json")
+        self._dirty = False
+        self._flush_task = None
+        self.index = {}
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f: self.index = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log_error(f"Image cache index unreadable, starting empty: {e}")
+
+    def _blob_path(self, digest): return os.path.join(self.root, "blobs", digest)
+    def _variant_path(self, digest, size): return os.path.join(self.root, "variants", f"{digest}_{size}.png")
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f: f.write(data)
+        os.replace(tmp, path)
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f: return f.read()
+        except OSError:
+            return None
+
+    def _store(self, path, data):
+        if not os.path.exists(path): self._write(path, data)
+
+    def _remove(self, paths):
+        for path in paths:
+            try: os.remove(path)
+            except OSError: pass
+
+    def _save_index(self):
+        # Disk işi loop dışında; index.json her değişiklikte değil, flush_delay içinde bir kere yazılır
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        if not self._dirty: return
+        self._dirty = False
+        data = json.dumps(self.index, separators=(",", ":")).encode()     # loop üzerinde, index değişmeden
+        try:
+            await asyncio.to_thread(self._write, self._index_path, data)
+        except Exception as e:
+            self._dirty = True
+            log_error(f"Image cache index write failed: {e}")
+
+    def flush(self):
+        # Kapanışta bekleyen index değişikliklerini hemen yaz
+        if self._flush_task is not None and not self._flush_task.done(): self._flush_task.cancel()
+        if not self._dirty: return
+        self._dirty = False
+        self._write(self._index_path, json.dumps(self.index, separators=(",", ":")).encode())
+
+    async def get(self, url, timeout=10, image_only=True):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        entry = self.index.get(key)
+        cached = await asyncio.to_thread(self._read, self._blob_path(entry["hash"])) if entry else None
+        now = time.time()
+        if cached is not None and now - entry["checked"] < self.fresh_for:
+            self.hits += 1
+            entry["used"] = now
+            return cached
+        known = entry if cached is not None else {}
+        data, validators = await fetch_conditional(
+            url, timeout=timeout, image_only=image_only, etag=known.get("etag"), last_modified=known.get("last_modified")
+        )
+        if data == b"":
+            self.revalidated += 1
+            entry.update(checked=now, used=now)
+            self._save_index()
+            return cached
+        if data is None:
+            # Ağ hatası: eskimiş kopya varsa onu kullan
+            if cached is not None: entry["used"] = now
+            else: self.misses += 1
+            return cached
+        self.misses += 1
+        digest = hashlib.sha256(data).hexdigest()
+        variants, removed = {}, []
+        if entry and entry["hash"] == digest: variants = entry.get("variants", {})
+        elif entry: removed = self._drop(key)
+        await asyncio.to_thread(self._store, self._blob_path(digest), data)
+        self.index[key] = {
+            "hash": digest, "size": len(data), "variants": variants,
+            "etag": validators.get("etag"), "last_modified": validators.get("last_modified"), "checked": now, "used": now,
+        }
+        removed += self._evict()
+        if removed: await asyncio.to_thread(self._remove, removed)
+        self._save_index()
+        return data
+
+    async def logo(self, url, size, timeout=8):
+        with metrics.timer("logo"):
+            return await self._logo(url, size, timeout)
+
+    async def _logo(self, url, size, timeout):
+        # Render edilecek boyuta küçültülmüş PNG; URL yoksa/inmezse FALLBACK_LOGO
+        data = await self.get(url, timeout=timeout) if url else None
+        if data is None:
+            return await asyncio.to_thread(self._fallback_variant, size)
+        entry = self.index.get(hashlib.sha256(url.encode()).hexdigest())
+        cached = await asyncio.to_thread(self._read, self._variant_path(entry["hash"], size)) if entry else None
+        if cached is not None: return cached
+        try:
+            variant = await asyncio.to_thread(_logo_variant, data, size)
+        except Exception as e:
+            log_error(f"Logo decode failed: {e}, url={url}")
+            return await asyncio.to_thread(self._fallback_variant, size)
+        if entry is None: return variant
+        await asyncio.to_thread(self._write, self._variant_path(entry["hash"], size), variant)
+        entry.setdefault("variants", {})[str(size)] = len(variant)
+        removed = self._evict()
+        if removed: await asyncio.to_thread(self._remove, removed)
+        self._save_index()
+        return variant
+
+    def _fallback_variant(self, size):
+        path = self._variant_path("fallback", size)
+        data = self._read(path)
+        if data is None and os.path.exists(FALLBACK_LOGO):
+            with open(FALLBACK_LOGO, "rb") as f: data = _logo_variant(f.read(), size)
+            self._write(path, data)
+        return data
+
+    def total_bytes(self):
+        return sum(e["size"] + sum(e.get("variants", {}).values()) for e in self.index.values())
+
+    def _drop(self, key):
+        # Index'ten çıkarır; silinecek dosyaları döner (silme thread'de)
+        entry = self.index.pop(key)
+        if any(e["hash"] == entry["hash"] for e in self.index.values()): return []
+        return [self._blob_path(entry["hash"])] + [self._variant_path(entry["hash"], s) for s in entry.get("variants", {})]
+
+    def _evict(self):
+        total, removed = self.total_bytes(), []
+        for key in sorted(self.index, key=lambda k: self.index[k]["used"]):
+            if total <= self.max_bytes: break
+            entry = self.index[key]
+            total -= entry["size"] + sum(entry.get("variants", {}).values())
+            removed += self._drop(key)
+        return removed
+
+    def stats(self):
+        total = self.hits + self.misses + self.revalidated
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                "hit_ratio": round((self.hits + self.revalidated) / total, 3) if total else 0.0,
+                "entries": len(self.index), "bytes": self.total_bytes()}
+
+def decode_image(data, size=None, fit=None, max_pixels=IMAGE_MAX_PIXELS):
+    # Header okunur, piksel sınırı decode'dan önce kontrol edilir; animasyonlarda sadece ilk kare.
+    # JPEG draft() ve reduce() ile hedef boyuta yakın decode, tam çözünürlük belleğe alınmaz.
+    img = Image.open(BytesIO(data))
+    if getattr(img, "is_animated", False): img.seek(0)
+    # size: tam kare logo, fit: en-boy korunarak en fazla fit x fit
+    target = size or fit
+    if target: img.draft("RGB", (target, target))      # JPEG'de boyutu DCT ölçeğine düşürür
+    if img.width * img.height > max_pixels:
+        raise ValueError(f"image too large: {img.width}x{img.height}")
+    if target:
+        factor = min(img.width, img.height) // target if size else max(img.width, img.height) // target
+        if factor >= 2:
+            if img.mode not in ("L", "LA", "RGB", "RGBA", "I", "F"): img = img.convert("RGBA")
+            img = img.reduce(factor)
+    img = img.convert("RGBA")
+    if size: img = img.resize((size, size))
+    elif fit: img.thumbnail((fit, fit))
+    return img
+
+def _logo_variant(data, size):
+    out = BytesIO(); decode_image(data, size).save(out, format="PNG")
+    return out.getvalue()
+
+image_cache = ImageCache()
+
+def render_listing_banner(token_name, symbol, chain, contract, logo, website_url, change, change_interval):
     try:
-        if not os.path.exists(BANNER_PATH): log_error("Banner not found!"); return None
-        banner = Image.open(BANNER_PATH).convert("RGBA")
+        ctx = get_render_context()
+        banner = ctx.base_banner()
+        if banner is None: log_error("Banner not found!"); return None
         width, height = banner.size
-        resp = requests.get(logo_url, timeout=8)
-        if resp.status_code != 200: log_error("Logo download failed!"); return None
-        logo = Image.open(BytesIO(resp.content)).convert("RGBA")
-        font_headline, font_token, font_chain, font_contract, font_web, font_change = load_fonts()
+        logo = Image.open(BytesIO(logo)).convert("RGBA")
+        font_headline, font_token, font_chain, font_contract, font_web, font_change = ctx.fonts
         draw = ImageDraw.Draw(banner)
         headline = f" ${(symbol or '').upper()} #Trending Now Worldwide"
         hx = (width - _textlength(draw, headline, font_headline)) // 2
         draw.text((hx, 60), headline, font=font_headline, fill="white")
-        logo_size = 300
+        logo_size = LOGO_SIZE
         logo = logo.resize((logo_size, logo_size))
-        mask = Image.new("L", (logo_size, logo_size), 0)
-        ImageDraw.Draw(mask).ellipse((0, 0, logo_size, logo_size), fill=255)
         circular_logo = Image.new("RGBA", (logo_size, logo_size), (0, 0, 0, 0))
-        circular_logo.paste(logo, (0, 0), mask=mask)
+        circular_logo.paste(logo, (0, 0), mask=ctx.mask(logo_size))
         logo_x = (width - logo_size) // 2; logo_y = 220
-        border_size = logo_size + 20
-        border = Image.new("RGBA", (border_size, border_size), (0, 0, 0, 0))
-        border_draw = ImageDraw.Draw(border)
-        for i in range(10):
-            color = (255, 215 - i*10, 0 + i*20, 255)
-            border_draw.ellipse((i, i, border_size - i, border_size - i), outline=color, width=4)
-        banner.alpha_composite(border, (logo_x - 10, logo_y - 10))
+        banner.alpha_composite(ctx.border, (logo_x - 10, logo_y - 10))
         banner.paste(circular_logo, (logo_x, logo_y), circular_logo)
         if change is not None and change_interval and change > 0:
             perc_text = f"{int(change)}% Increased"
@@ -223,13 +1149,26 @@ def generate_image_banner(token_name, symbol, chain, contract, logo_url, website
             wy = height - 80
             wx = (width - _textlength(draw, website_url, font_web)) // 2
             draw.text((wx, wy), website_url, font=font_web, fill="white")
-        out = BytesIO(); banner.save(out, format="PNG"); out.name = "banner.png"; out.seek(0)
-        log_success("Banner generated.")
-        return out
+        return banner
     except Exception as e:
         log_error(f"Image error: {e}")
         return None
-def format_pair_message(pair):
+
+def _named_file(data, name):
+    out = BytesIO(data); out.name = name; out.seek(0)
+    return out
+
+async def generate_image_banner(token_name, symbol, chain, contract, logo_url, website_url, change, change_interval):
+    logo = await image_cache.logo(logo_url, LOGO_SIZE, timeout=8)
+    if not logo: log_error("Logo download failed!"); return None
+    data = await render_pool.render({
+        "layout": "listing", "token_name": token_name, "symbol": symbol, "chain": chain, "contract": contract,
+        "logo": logo, "website_url": website_url, "change": change, "change_interval": change_interval,
+    })
+    if not data: return None
+    log_success("Banner generated.")
+    return _named_file(data, banner_filename("banner"))
+async def format_pair_message(pair):
     base = pair.get("baseToken", {}) or {}
     symbol = base.get("symbol", "???")
     name = base.get("name", "Unknown")
@@ -293,28 +1232,10 @@ def format_pair_message(pair):
 {hashtags}
 """.strip()
 
-    # 🔥 ÖNCE header görselini dene (üzerine yazı yazmadan)
-    media_file = None
-    if header_url:
-        try:
-            headers = {"User-Agent": random.choice(USER_AGENTS)}
-            resp = requests.get(header_url, headers=headers, timeout=10)
-            ctype = (resp.headers.get("Content-Type") or "").lower()
-            if resp.status_code == 200 and "image" in ctype and resp.content:
-                media_file = BytesIO(resp.content)
-                media_file.name = "header.png"
-                media_file.seek(0)
-                log_success("Header URL kullanıldı ✅")
-            else:
-                log_error(f"Header fetch invalid: status={resp.status_code}, ctype={ctype}")
-        except Exception as e:
-            log_error(f"Header url indirilemedi: {e}")
-
-    # 🔥 Header yoksa/başarısızsa → banner üret
-    if not media_file:
-        media_file = generate_image_banner(
-            name, symbol, chain, contract, logo_url, website_url, best_change, best_int
-        )
+    # 🔥 Header (öncelikli) ve banner aynı anda hazırlanır
+    media_file = await prepare_media(
+        header_url, (name, symbol, chain, contract, logo_url, website_url, best_change, best_int)
+    )
 
     if not media_file:
         return None, None
@@ -325,15 +1246,60 @@ def format_pair_message(pair):
     return media_file, message
 
 
+async def prepare_media(header_url, banner_args, deadline=MEDIA_DEADLINE, header_grace=MEDIA_HEADER_GRACE):
+    # Header indirme, logo indirme ve banner render paralel başlar; öncelik sırasıyla ilk geçerli
+    # sonuç alınır (header > banner), gerisi iptal edilir. Banner hazırsa header'a sadece
+    # header_grace kadar süre tanınır. Süre dolunca elde ne varsa o.
+    candidates = []
+    if header_url: candidates.append(("header", asyncio.create_task(generate_header_image(header_url))))
+    candidates.append(("banner", asyncio.create_task(generate_image_banner(*banner_args))))
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    grace_end = None
+
+    def ready(task):
+        return task.done() and not task.cancelled() and task.exception() is None and task.result()
+
+    def take(name, task):
+        if name == "header": log_success("Header URL kullanıldı ✅")
+        elif header_url:
+            header = candidates[0][1]
+            log_error("Header url indirilemedi." if header.done() else f"Header not ready within {header_grace:.1f}s grace, using banner.")
+        return task.result()
+
+    try:
+        while True:
+            for name, task in candidates:
+                if ready(task): return take(name, task)
+                if not task.done(): break       # daha öncelikli aday hâlâ çalışıyor
+            pending = {task for _, task in candidates if not task.done()}
+            if not pending: break
+            limit = end
+            if any(ready(task) for _, task in candidates):
+                if grace_end is None: grace_end = loop.time() + header_grace
+                limit = min(end, grace_end)
+            remaining = limit - loop.time()
+            if remaining <= 0: break        # süre doldu
+            await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for name, task in candidates:
+            if ready(task): return take(name, task)
+        if header_url and candidates[0][1].done(): log_error("Header url indirilemedi.")
+        log_error(f"Media not ready within {deadline:.0f}s.")
+        return None
+    finally:
+        for _, task in candidates:
+            if not task.done(): task.cancel()
+
 def load_font_simple(size):
     try: return ImageFont.truetype("arialbd.ttf", size)
     except: return ImageFont.load_default()
 
-def generate_worldwide_banner(tokens):
-    try: banner = Image.open(BANNER_PATH).convert("RGBA")
-    except: banner = Image.new("RGBA", (1000, 950), (20, 20, 30, 255))
+def render_worldwide_banner(tokens):
+    ctx = get_render_context()
+    banner = ctx.base_banner()
+    if banner is None: banner = Image.new("RGBA", (1000, 950), (20, 20, 30, 255))
     draw = ImageDraw.Draw(banner)
-    font_headline, font_token, font_chain, font_contract, font_web, font_change = load_fonts()
+    font_headline, font_token, font_chain, font_contract, font_web, font_change = ctx.fonts
     font_title  = font_headline
     font_symbol = font_token
     font_change = font_change
@@ -341,33 +1307,25 @@ def generate_worldwide_banner(tokens):
     title = "Worldwide Top Trends"
     tw = draw.textlength(title, font=font_title)
     draw.text(((banner.width - tw) // 2, 30), title, font=font_title, fill="white")
-    SIZE_BIG, SIZE_SMALL = 132, 108
     cx = banner.width // 2
     cy1, cy2, cy3 = 230, 360, 600
     gap2, gap3 = 420, 380
     centers = [(cx, cy1), (cx - gap2 // 2, cy2), (cx + gap2 // 2, cy2), (cx - gap3, cy3), (cx, cy3), (cx + gap3, cy3)]
     def paste_circle(center, size, logo_img, gold=False):
         x = center[0] - size // 2; y = center[1] - size // 2
-        mask = Image.new("L", (size, size), 0); ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
-        circ = Image.new("RGBA", (size, size), (0, 0, 0, 0)); circ.paste(logo_img, (0, 0), mask=mask)
-        ring = ImageDraw.Draw(circ)
-        if gold:
-            ring.ellipse((2, 2, size - 2, size - 2), outline=(255, 215, 0, 255), width=6)
-            ring.ellipse((6, 6, size - 6, size - 6), outline=(255, 235, 120, 255), width=3)
-        else:
-            ring.ellipse((2, 2, size - 2, size - 2), outline=(255, 255, 255, 255), width=4)
+        circ = Image.new("RGBA", (size, size), (0, 0, 0, 0)); circ.paste(logo_img, (0, 0), mask=ctx.mask(size))
+        circ.alpha_composite(ctx.ring(size, gold))
         banner.paste(circ, (x, y), circ)
         return x, y, size
-    for idx, (chg, tf, sym, chain, logo_url, url, tw_user, tg_link) in enumerate(tokens[:6]):
+    for idx, (chg, sym, logo_bytes) in enumerate(tokens[:6]):
         size = SIZE_BIG if idx == 0 else SIZE_SMALL
         try:
-            if logo_url:
-                resp = requests.get(logo_url, timeout=6)
-                logo = Image.open(BytesIO(resp.content)).convert("RGBA").resize((size, size))
+            if logo_bytes:
+                logo = Image.open(BytesIO(logo_bytes)).convert("RGBA").resize((size, size))
             else:
                 raise Exception("no logo")
         except:
-            logo = Image.open(FALLBACK_LOGO).convert("RGBA").resize((size, size)) if os.path.exists(FALLBACK_LOGO) else Image.new("RGBA", (size, size), (80, 80, 100, 255))
+            logo = ctx.fallback(size)
         x, y, size = paste_circle(centers[idx], size, logo, gold=(idx == 0))
         rank_text = f"#{idx+1}"
         rw = draw.textlength(rank_text, font=font_rank)
@@ -378,10 +1336,15 @@ def generate_worldwide_banner(tokens):
         chg_text = f"+{chg:.0f}%"
         cw = draw.textlength(chg_text, font=font_change)
         draw.text((x + (size - cw)//2, y + size + 44), chg_text, font=font_change, fill=(0, 255, 0, 255))
-    out = BytesIO(); banner.save(out, format="PNG"); out.name = "trends.png"; out.seek(0)
-    return out
+    return banner
 
-def generate_placeholder_trends_banner():
+async def generate_worldwide_banner(tokens):
+    tokens = tokens[:6]
+    logos = await asyncio.gather(*(image_cache.logo(t[4], SIZE_BIG if i == 0 else SIZE_SMALL, timeout=6) for i, t in enumerate(tokens)))
+    data = await render_pool.render({"layout": "worldwide", "tokens": [(t[0], t[2], logo) for t, logo in zip(tokens, logos)]})
+    return _named_file(data, banner_filename("trends")) if data else None
+
+def render_placeholder_trends_banner():
     w, h = 1000, 340
     img = Image.new("RGBA", (w, h), (20, 20, 30, 255))
     d = ImageDraw.Draw(img)
@@ -391,8 +1354,134 @@ def generate_placeholder_trends_banner():
     tw1 = d.textlength(t1, font=f1); tw2 = d.textlength(t2, font=f2)
     d.text(((w - tw1)//2, 80), t1, font=f1, fill="white")
     d.text(((w - tw2)//2, 160), t2, font=f2, fill=(200,200,200,255))
-    out = BytesIO(); img.save(out, format="PNG"); out.name = "trends.png"; out.seek(0)
-    return out
+    return img
+
+async def generate_placeholder_trends_banner():
+    data = await render_pool.render({"layout": "placeholder"})
+    return _named_file(data, banner_filename("trends")) if data else None
+
+_BANNER_EXT = {"PNG": "png", "JPEG": "jpg"}
+
+def banner_filename(stem, encoding=None):
+    return f"{stem}.{_BANNER_EXT.get((encoding or BANNER_ENCODING)['format'], 'png')}"
+
+def encode_banner(img, encoding=None):
+    # RGBA bir kere düzleştirilir, gerekirse Telegram foto limitlerine küçültülür, sonra encode
+    enc = dict(BANNER_ENCODING, **(encoding or {}))
+    fmt = enc["format"] if enc["format"] in _BANNER_EXT else "PNG"
+    started = time.perf_counter()
+    if img.mode != "RGB":
+        flat = Image.new("RGB", img.size, (0, 0, 0))
+        flat.paste(img, mask=img.getchannel("A") if "A" in img.getbands() else None)
+        img = flat
+    scale = 1.0
+    if img.width + img.height > TELEGRAM_PHOTO_MAX_SUM: scale = TELEGRAM_PHOTO_MAX_SUM / (img.width + img.height)
+    if enc["max_side"] and max(img.size) * scale > enc["max_side"]: scale = enc["max_side"] / max(img.size)
+    if scale < 1.0:
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+    out = BytesIO()
+    if fmt == "JPEG":
+        img.save(out, format="JPEG", quality=enc["quality"], subsampling=enc["subsampling"], optimize=enc["optimize"], progressive=enc["optimize"])
+    else:
+        img.save(out, format="PNG", optimize=enc["optimize"])
+    data = out.getvalue()
+    report = {"format": fmt, "size": img.size, "bytes": len(data), "encode_ms": round((time.perf_counter() - started) * 1000, 1)}
+    if len(data) > TELEGRAM_PHOTO_MAX_BYTES: log_error(f"Encoded banner exceeds Telegram photo limit: {report}")
+    return data, report
+
+def header_passthrough(img, size):
+    # Küçültme/kare atma gerekmiyorsa decode + encode yapılmaz (sadece başlık okunur)
+    w, h = img.size
+    return (img.format in ("JPEG", "PNG") and img.mode in ("RGB", "L", "P") and "transparency" not in img.info
+            and not getattr(img, "is_animated", False) and w * h <= IMAGE_MAX_PIXELS and max(w, h) <= HEADER_MAX_SIDE
+            and w + h <= TELEGRAM_PHOTO_MAX_SUM and max(w, h) <= 20 * min(w, h) and size <= TELEGRAM_PHOTO_MAX_BYTES)
+
+def render_header_image(data):
+    try:
+        img = Image.open(BytesIO(data))
+        if header_passthrough(img, len(data)):
+            return data, {"format": img.format, "size": img.size, "bytes": len(data), "encode_ms": 0.0}
+        return decode_image(data, fit=HEADER_MAX_SIDE)
+    except Exception as e:
+        log_error(f"Header decode failed: {e}")
+        return None
+
+def _image_filename(stem, data):
+    return f"{stem}.{_BANNER_EXT.get(Image.open(BytesIO(data)).format, 'png')}"
+
+async def generate_header_image(header_url):
+    # Header: sınırlı indirme, limitler içindeyse orijinal bytes; değilse sınırlı decode + JPEG
+    with metrics.timer("header"):
+        data = await image_cache.get(header_url, timeout=10)
+    if not data: return None
+    data = await render_pool.render({"layout": "header", "data": data, "encoding": HEADER_ENCODING})
+    return _named_file(data, _image_filename("header", data)) if data else None
+
+RENDER_LAYOUTS = {
+    "header": render_header_image,
+    "listing": render_listing_banner,
+    "worldwide": render_worldwide_banner,
+    "placeholder": render_placeholder_trends_banner,
+}
+
+def render_spec(spec):
+    spec = dict(spec)
+    layout, encoding = spec.pop("layout"), spec.pop("encoding", None)
+    img = RENDER_LAYOUTS[layout](**spec)
+    if img is None: return None
+    # Layout hazır bytes dönebilir (header passthrough); yoksa encode
+    data, report = img if isinstance(img, tuple) else encode_banner(img, encoding)
+    report["layout"] = layout
+    return data, report
+
+class RenderPool:
+    # Pillow compositing + encode event loop dışında, process veya thread worker'larda
+    def __init__(self, kind=RENDER_POOL, workers=RENDER_WORKERS):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self._executor = None
+        self.encoded = {}       # layout -> {"count", "bytes", "encode_ms"}
+
+    def start(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=get_render_context
+                )
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="render", initializer=get_render_context)
+        return self._executor
+
+    async def render(self, spec):
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.start(), render_spec, spec)
+        except Exception as e:
+            metrics.inc("stage_errors_total", stage="render", layout=spec["layout"], source=metric_source.get())
+            log_error(f"Render worker error: {e!r}")
+            return None
+        if result is None: return None
+        data, report = result
+        # Worker'daki encode süresi ayrı; render = kuyruk + compositing
+        elapsed, source = time.perf_counter() - started, metric_source.get()
+        metrics.observe("stage_seconds", max(0.0, elapsed - report["encode_ms"] / 1000), stage="render", layout=report["layout"], source=source)
+        metrics.observe("stage_seconds", report["encode_ms"] / 1000, stage="encode", layout=report["layout"], source=source)
+        total = self.encoded.setdefault(report["layout"], {"count": 0, "bytes": 0, "encode_ms": 0.0})
+        total["count"] += 1; total["bytes"] += report["bytes"]; total["encode_ms"] += report["encode_ms"]
+        log_info(f"Encoded {report['layout']}: {report['format']} {report['size'][0]}x{report['size'][1]}, "
+                 f"{report['bytes'] / 1024:.0f} KB in {report['encode_ms']} ms")
+        return data
+
+    def stats(self):
+        return {layout: {"count": t["count"], "avg_kb": round(t["bytes"] / t["count"] / 1024, 1),
+                         "avg_encode_ms": round(t["encode_ms"] / t["count"], 1)} for layout, t in self.encoded.items()}
+
+    def shutdown(self, wait=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+render_pool = RenderPool()
 
 def build_trends_caption(tokens):
     caption = "🔥 <b>Worldwide Top #Trends Diamonds Now | Live Update</b>\n\n"
@@ -421,139 +1510,1115 @@ def build_trends_caption(tokens):
     caption += "\n👉 <b><a href='https://t.me/Lets_Announcepad'>Join Community</a> | <a href='https://t.me/Mike_letsannouncepad'>Apply Trend Now</a></b>"
     return caption
 
+class StateFile:
+    # ImageCache index'iyle aynı yol: değişiklik dirty işaretler, flush_delay içinde bir kere yazılır.
+    # JSON loop üzerinde (veri değişmeden) üretilir, disk yazma thread'de; kapanışta flush()
+    def __init__(self, path, dump, flush_delay=STATE_FLUSH):
+        self.path = path
+        self.dump = dump
+        self.flush_delay = flush_delay
+        self._dirty = False
+        self._flush_task = None
+
+    def _encode(self):
+        return json.dumps(self.dump(), separators=(",", ":")).encode()
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f: f.write(data)
+        os.replace(tmp, self.path)
+
+    def mark(self):
+        if not self.path: return
+        self._dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.flush()     # loop dışından çağrıldıysa hemen yaz
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        if not self._dirty: return
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._write, self._encode())
+        except Exception as e:
+            self._dirty = True
+            log_error(f"State write failed for {self.path}: {e}")
+
+    def flush(self):
+        if self._flush_task is not None and not self._flush_task.done(): self._flush_task.cancel()
+        if not self._dirty: return
+        self._dirty = False
+        self._write(self._encode())
+
+class ContractIndex:
+    # Kanal geçmişini bir kere tarar, sonra sadece min_id'den yeni mesajları okur
+    def __init__(self, path=CONTRACT_INDEX_PATH, window=CONTRACT_WINDOW, max_entries=CONTRACT_INDEX_MAX):
+        self.path = path
+        self.window = window
+        self.max_entries = max_entries
+        self.last_id = 0
+        self.trend_msg_id = None
+        self.contracts = {}     # address -> [first_seen, last_seen]
+        self._lock = asyncio.Lock()
+        self._file = StateFile(path, self.dump)
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: state = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            log_error(f"Contract index unreadable, full rescan: {e}")
+            return
+        self.restore(state)
+
+    def restore(self, state):
+        self.last_id = state.get("last_id", 0)
+        self.trend_msg_id = state.get("trend_msg_id")
+        self.contracts = state.get("contracts", {})
+
+    def dump(self):
+        return {"last_id": self.last_id, "trend_msg_id": self.trend_msg_id, "contracts": self.contracts}
+
+    def save(self):
+        self._file.mark()
+
+    def flush(self):
+        self._file.flush()
+
+    def add(self, address, ts):
+        seen = self.contracts.get(address)
+        if seen is None: self.contracts[address] = [ts, ts]
+        else: seen[0], seen[1] = min(seen[0], ts), max(seen[1], ts)
+
+    def prune(self, now=None):
+        cutoff = (now or time.time()) - self.window
+        for a in [a for a, (_, last) in self.contracts.items() if last < cutoff]: del self.contracts[a]
+        if len(self.contracts) > self.max_entries:
+            for a in sorted(self.contracts, key=lambda a: self.contracts[a][1])[:len(self.contracts) - self.max_entries]:
+                del self.contracts[a]
+
+    def feed(self, message):
+        self.last_id = max(self.last_id, message.id)
+        text = message.message or ""
+        ts = message.date.timestamp() if message.date else time.time()
+        for c in scan_contracts(text):
+            if c.startswith("0x"): self.add(c, ts)
+        if message.out and TREND_MARKER in text and message.id > (self.trend_msg_id or 0):
+            self.trend_msg_id = message.id
+
+    async def update(self, tg, channel, cold_limit=150):
+        async with self._lock:
+            before, count = self.last_id, 0
+            # İlk çalıştırmada son cold_limit mesaj, sonra sadece yeniler
+            limit = cold_limit if not self.last_id else CONTRACT_SCAN_MAX
+            async for m in tg.iter_messages(channel, limit=limit, min_id=self.last_id):
+                self.feed(m); count += 1
+            self.prune()
+            if self.last_id != before: self.save()
+            log_info(f"Contract index: {count} new messages, {len(self.contracts)} contracts, last_id={self.last_id}.")
+
+    def addresses(self):
+        return sorted(self.contracts, key=lambda a: self.contracts[a][1], reverse=True)
+
+contract_index = ContractIndex()
+
 async def collect_contracts_from_channel(limit=200):
-    msgs = await client.get_messages(TARGET_CHANNEL_ID, limit=limit)
-    contracts = []
-    for m in msgs:
-        contracts += re.findall(r"0x[a-fA-F0-9]{40}", m.message or "")
-    u = list(set(contracts))
+    await contract_index.update(client, TARGET_CHANNEL_ID, cold_limit=limit)
+    u = contract_index.addresses()
     log_info(f"Worldwide: collected {len(u)} contracts.")
     return u
 
-async def pick_top_tokens(contracts):
-    token_changes, seen_symbols = [], set()
-    for token in contracts:
-        pairs = fetch_token_info(token); await asyncio.sleep(1)
-        if not pairs: continue
-        for pair in pairs:
-            change, tf = select_best_change(pair.get("priceChange", {}) or {})
-            if change is None or change <= 0:
-                continue
+def trend_entry(pair):
+    change, tf = select_best_change(pair.get("priceChange", {}) or {})
+    if change is None or change <= 0:
+        return None
 
 
-            # 🔥 %50 – %500 arası pump filtre
-            if change < 10 or change > 999: continue
+    # 🔥 %50 – %500 arası pump filtre
+    if change < 10 or change > 999: return None
 
-            base = pair.get("baseToken", {}) or {}
-            symbol = base.get("symbol", "???")
-            if symbol in seen_symbols: continue
-            seen_symbols.add(symbol)
+    base = pair.get("baseToken", {}) or {}
+    symbol = base.get("symbol", "???")
+
+    logo = base.get("logoUrl") or (pair.get("info", {}) or {}).get("imageUrl")
+    chain = (pair.get("chainId") or "EVM").capitalize()
+    url = pair.get("url", "https://dexscreener.com")
+    socials = (pair.get("info", {}) or {}).get("socials", [])
+    tw_user, tg_link = None, None
+    for s in socials:
+        if s.get("type") == "twitter": tw_user = s.get("url")
+        if s.get("type") == "telegram": tg_link = s.get("url")
+
+    # 🔥 Twitter hesabı olmayanları atla
+    if not tw_user: return None
+
+    return (change, tf, symbol, chain, logo, url, tw_user, tg_link)
+
+class TrendRanker:
+    # Sembol başına tek kayıt + lazy-silinen max-heap; top(k) tam sıralama yapmadan okur
+    def __init__(self, k=TREND_TOP_K, ttl=TREND_TTL, half_life=TREND_HALF_LIFE):
+        self.k = k
+        self.ttl = ttl
+        self.half_life = half_life
+        self.entries = {}       # symbol -> {"trend", "address", "pair", "liquidity", "updated", "version"}
+        self._heap = []
+        self._version = itertools.count()
+        self._swept = 0.0
+
+    def _score(self, change, updated):
+        # change * 0.5 ** (yaş / half_life) sıralaması zamandan bağımsız bir anahtara denk
+        if self.half_life <= 0: return change
+        return math.log2(change) + updated / self.half_life
+
+    def offer(self, pair, now=None):
+        if now is None: now = time.time()
+        self._sweep(now)
+        base = pair.get("baseToken", {}) or {}
+        symbol, address = base.get("symbol", "???"), _addr_key(base.get("address") or "")
+        current = self.entries.get(symbol)
+        trend = trend_entry(pair)
+        if trend is None:
+            # Aynı token artık filtreden geçmiyorsa listeden çıkar
+            if current and current["address"] == address and current["pair"] == pair.get("pairAddress"):
+                del self.entries[symbol]
+            return False
+        liquidity = (pair.get("liquidity", {}) or {}).get("usd", 0) or 0
+        if current and current["updated"] + self.ttl > now:
+            if current["address"] == address:
+                if current["pair"] != pair.get("pairAddress") and liquidity < current["liquidity"]: return False
+            elif trend[0] <= current["trend"][0]:
+                return False
+        version = next(self._version)
+        self.entries[symbol] = {"trend": trend, "address": address, "pair": pair.get("pairAddress"),
+                                "liquidity": liquidity, "updated": now, "version": version}
+        heapq.heappush(self._heap, (-self._score(trend[0], now), version, symbol))
+        if len(self._heap) > 4 * len(self.entries) + 64: self._compact(now)
+        return True
+
+    def offer_many(self, pairs, now=None):
+        return sum(self.offer(p, now) for p in pairs or [])
+
+    def _valid(self, item, now):
+        _, version, symbol = item
+        e = self.entries.get(symbol)
+        if e is None or e["version"] != version: return False
+        if e["updated"] + self.ttl <= now:
+            del self.entries[symbol]
+            return False
+        return True
+
+    def _sweep(self, now):
+        # top() sadece ilk K'yı okur; altında kalan süresi dolmuş semboller ttl/4'te bir toplu silinir
+        if now - self._swept >= self.ttl / 4: self._compact(now)
+
+    def _compact(self, now=None):
+        if now is None: now = time.time()
+        self._swept = now
+        for symbol in [s for s, e in self.entries.items() if e["updated"] + self.ttl <= now]: del self.entries[symbol]
+        self._heap = [item for item in self._heap if (self.entries.get(item[2]) or {}).get("version") == item[1]]
+        heapq.heapify(self._heap)
+
+    def top(self, k=None, now=None):
+        k = k or self.k
+        if now is None: now = time.time()
+        self._sweep(now)
+        picked = []
+        while self._heap and len(picked) < k:
+            item = heapq.heappop(self._heap)
+            if self._valid(item, now): picked.append(item)
+        for item in picked: heapq.heappush(self._heap, item)
+        return [self.entries[symbol]["trend"] for _, _, symbol in picked]
+
+    def dump(self, now=None):
+        if now is None: now = time.time()
+        return [dict(e, symbol=symbol, version=None) for symbol, e in self.entries.items() if e["updated"] + self.ttl > now]
+
+    def restore(self, rows, now=None):
+        if now is None: now = time.time()
+        for row in rows:
+            row = dict(row)
+            symbol = row.pop("symbol")
+            if row["updated"] + self.ttl <= now: continue
+            current = self.entries.get(symbol)
+            if current and current["updated"] >= row["updated"]: continue
+            row["trend"], row["version"] = tuple(row["trend"]), next(self._version)
+            self.entries[symbol] = row
+            heapq.heappush(self._heap, (-self._score(row["trend"][0], row["updated"]), row["version"], symbol))
+        self._compact(now)
+
+    def __len__(self): return len(self.entries)
+
+trend_ranker = TrendRanker()
+
+class SharedTrends:
+    # Ölçekli modda canlı sıralama worker'lara dağılır: worker gönderdiği pair'in kaydını Redis'e yazar,
+    # lider Worldwide postundan önce okuyup kendi sıralamasına katar (TrendRanker.restore, yeni olan kazanır).
+    # Kayıtlar sembol başına hash alanı, güncellenme zamanı ZSET'te; TTL'i geçenler okunurken silinir.
+    def __init__(self, url=REDIS_URL, key=TREND_SHARED_KEY, ttl=TREND_TTL):
+        self.redis = get_redis(url)
+        self.key, self.index = key, f"{key}:updated"
+        self.ttl = ttl
+        self.published = self.pulled = self.errors = 0
+
+    async def offer(self, ranker, pair):
+        if not ranker.offer(pair): return False
+        symbol = (pair.get("baseToken", {}) or {}).get("symbol", "???")
+        row = dict(ranker.entries[symbol], symbol=symbol, version=None)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(self.key, symbol, json.dumps(row))
+                pipe.zadd(self.index, {symbol: row["updated"]})
+                pipe.pexpire(self.key, int(self.ttl * 1000))
+                pipe.pexpire(self.index, int(self.ttl * 1000))
+                await pipe.execute()
+            self.published += 1
+        except Exception as e:
+            self.errors += 1
+            log_error(f"Redis trend publish error: {e}")
+        return True
+
+    async def pull(self, ranker):
+        cutoff = time.time() - self.ttl
+        try:
+            stale = await self.redis.zrangebyscore(self.index, "-inf", cutoff)
+            if stale:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.zrem(self.index, *stale)
+                    pipe.hdel(self.key, *stale)
+                    await pipe.execute()
+            symbols = await self.redis.zrangebyscore(self.index, f"({cutoff}", "+inf")
+            rows = [json.loads(r) for r in await self.redis.hmget(self.key, symbols) if r] if symbols else []
+        except Exception as e:
+            self.errors += 1
+            log_error(f"Redis trend pull error: {e}")
+            return 0
+        ranker.restore(rows)
+        self.pulled += len(rows)
+        return len(rows)
 
-            logo = base.get("logoUrl") or (pair.get("info", {}) or {}).get("imageUrl")
-            chain = (pair.get("chainId") or "EVM").capitalize()
-            url = pair.get("url", "https://dexscreener.com")
-            socials = (pair.get("info", {}) or {}).get("socials", [])
-            tw_user, tg_link = None, None
-            for s in socials:
-                if s.get("type") == "twitter": tw_user = s.get("url")
-                if s.get("type") == "telegram": tg_link = s.get("url")
+    def stats(self):
+        return {"published": self.published, "pulled": self.pulled, "errors": self.errors}
 
-            # 🔥 Twitter hesabı olmayanları atla
-            if not tw_user: continue
+shared_trends = None    # ölçekli modda __main__ içinde kurulur
 
-            token_changes.append((change, tf, symbol, chain, logo, url, tw_user, tg_link))
-    top_tokens = sorted(token_changes, key=lambda x: x[0], reverse=True)[:8]
+async def pick_top_tokens(contracts):
+    results = await fetch_tokens_info(contracts, priority=PRIORITY_BULK)
+    for pairs in results.values():
+        trend_ranker.offer_many(pairs)
+    top_tokens = trend_ranker.top(TREND_TOP_K)
     log_info(f"Worldwide: top token count {len(top_tokens)}.")
     return top_tokens
 
+async def refresh_trends():
+    contracts = await collect_contracts_from_channel(limit=150)
+    return await pick_top_tokens(contracts)
+
+async def trend_refresh_task():
+    while True:
+        await asyncio.sleep(TREND_REFRESH_INTERVAL)
+        try:
+            await refresh_trends()
+        except Exception as e:
+            log_error(f"Trend refresh error: {e}")
+
+class MediaUploadCache:
+    # İçerik hash'i -> Telethon upload handle'ı; aynı byte'lar TTL içinde tekrar upload edilmez
+    def __init__(self, ttl=MEDIA_HANDLE_TTL, max_entries=MEDIA_HANDLE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = self.uploads = 0
+        self._handles = OrderedDict()   # digest -> (expires_at, handle)
+
+    async def get(self, tg, media):
+        data = media.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        item = self._handles.get(digest)
+        if item and item[0] > time.time():
+            self._handles.move_to_end(digest)
+            self.hits += 1
+            return digest, item[1]
+        with metrics.timer("upload"):
+            handle = await tg.upload_file(BytesIO(data), file_name=getattr(media, "name", None) or "media.png")
+        self.uploads += 1
+        self._handles[digest] = (time.time() + self.ttl, handle)
+        while len(self._handles) > self.max_entries: self._handles.popitem(last=False)
+        return digest, handle
+
+    def invalidate(self, digest):
+        self._handles.pop(digest, None)
+
+    def stats(self):
+        total = self.hits + self.uploads
+        return {"hits": self.hits, "uploads": self.uploads, "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._handles)}
+
+media_cache = MediaUploadCache()
+
+def _stale_upload(e):
+    return isinstance(e, errors.RPCError) and "FILE_PART" in str(e).upper()
+
+async def send_media(target, media, caption):
+    digest, handle = await media_cache.get(client, media)
+    try:
+        return await client.send_file(target, file=handle, caption=caption, parse_mode="HTML", link_preview=False)
+    except Exception as e:
+        if not _stale_upload(e): raise
+        # Handle sunucuda düşmüş: bir kere yeniden upload et
+        metrics.inc("upload_retries_total")
+        media_cache.invalidate(digest)
+        digest, handle = await media_cache.get(client, media)
+        return await client.send_file(target, file=handle, caption=caption, parse_mode="HTML", link_preview=False)
+
+async def edit_media(target, message_id, media, caption):
+    digest, handle = await media_cache.get(client, media)
+    try:
+        return await client.edit_message(target, message_id, text=caption, file=handle, parse_mode="HTML", link_preview=False)
+    except Exception as e:
+        if not _stale_upload(e): raise
+        metrics.inc("upload_retries_total")
+        media_cache.invalidate(digest)
+        digest, handle = await media_cache.get(client, media)
+        return await client.edit_message(target, message_id, text=caption, file=handle, parse_mode="HTML", link_preview=False)
+
+def percentile(values, q):
+    # Nearest-rank; values sıralı olmalı
+    if not values: return None
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+class Destination:
+    # Hedef başına sıra + minimum aralık; FloodWait gelirse süresi kadar bekleyip bir kez tekrar dener
+    def __init__(self, target, min_interval=DESTINATION_MIN_INTERVAL):
+        self.target = target
+        self.min_interval = min_interval
+        self.sent = self.failed = self.flood_waits = 0
+        self.latencies = deque(maxlen=500)
+        self._lock = asyncio.Lock()
+        self._next_at = 0.0
+
+    async def deliver(self, media, caption, edit_id=None):
+        async with self._lock:
+            wait = self._next_at - time.monotonic()
+            if wait > 0: await asyncio.sleep(wait)
+            try:
+                with metrics.timer("send", destination=self.target):
+                    return await self._attempt(media, caption, edit_id)
+            finally:
+                self._next_at = time.monotonic() + self.min_interval
+
+    async def _attempt(self, media, caption, edit_id):
+        for attempt in range(2):
+            try:
+                if edit_id:
+                    try:
+                        await edit_media(self.target, edit_id, media, caption)
+                    except errors.MessageNotModifiedError:
+                        pass
+                    return edit_id
+                return (await send_media(self.target, media, caption)).id
+            except errors.FloodWaitError as e:
+                self.flood_waits += 1
+                if attempt or e.seconds > FLOOD_WAIT_MAX: raise
+                log_error(f"Flood wait {e.seconds}s for {self.target}")
+                await asyncio.sleep(e.seconds)
+
+    def stats(self):
+        lat = sorted(self.latencies)
+        return {
+            "sent": self.sent, "failed": self.failed, "flood_waits": self.flood_waits,
+            "p50": round(percentile(lat, 0.5), 3) if lat else None,
+            "p95": round(percentile(lat, 0.95), 3) if lat else None,
+        }
+
+class DestinationRegistry:
+    # Post bir kere formatlanır/render edilir/upload edilir, sonra tüm hedeflere paralel gönderilir
+    def __init__(self, targets=DESTINATIONS):
+        self.destinations = {}
+        for t in targets: self.add(t)
+
+    def add(self, target, min_interval=DESTINATION_MIN_INTERVAL):
+        self.destinations[target] = Destination(target, min_interval)
+
+    def remove(self, target):
+        self.destinations.pop(target, None)
+
+    async def publish(self, media, caption, edit_ids=None):
+        # Dönüş: hedef -> mesaj id (başarısızsa None)
+        try:
+            await self._upload(media)
+        except Exception as e:
+            log_error(f"Upload error: {e}")
+            return dict.fromkeys(self.destinations)
+        started = time.monotonic()
+
+        async def one(dest):
+            edit_id = (edit_ids or {}).get(dest.target)
+            try:
+                msg_id = await dest.deliver(media, caption, edit_id)
+            except Exception as e:
+                if edit_id:
+                    log_error(f"Edit error on {dest.target}, posting new message: {e}")
+                    try:
+                        msg_id = await dest.deliver(media, caption)
+                    except Exception as e2:
+                        e = e2; msg_id = None
+                else:
+                    msg_id = None
+                if msg_id is None:
+                    dest.failed += 1
+                    log_error(f"Send error on {dest.target}: {e}")
+                    return None
+            latency = time.monotonic() - started
+            dest.sent += 1
+            dest.latencies.append(latency)
+            log_info(f"Delivered to {dest.target} in {latency:.2f}s")
+            return msg_id
+
+        results = await asyncio.gather(*(one(d) for d in self.destinations.values()))
+        return dict(zip(self.destinations, results))
+
+    async def _upload(self, media):
+        # Upload da FloodWait alabilir; Destination._attempt gibi bir kez bekleyip tekrar dener
+        for attempt in range(2):
+            try:
+                return await media_cache.get(client, media)
+            except errors.FloodWaitError as e:
+                if attempt or e.seconds > FLOOD_WAIT_MAX: raise
+                log_error(f"Flood wait {e.seconds}s for upload")
+                await asyncio.sleep(e.seconds)
+
+    def stats(self):
+        return {t: d.stats() for t, d in self.destinations.items()}
+
+destinations = DestinationRegistry()
+
+def trends_signature(tokens):
+    # Görünen içerik aynıysa (caption + logolar) edit gereksiz
+    shown = [(sym, chain, f"{chg:.0f}", tf, logo, url, tw, tg) for chg, tf, sym, chain, logo, url, tw, tg in tokens[:TREND_TOP_K]]
+    return hashlib.sha256(json.dumps(shown).encode()).hexdigest()
+
+_trends_signature = None
+_last_trends_post = 0.0
+trend_msg_ids = {}      # hedef -> takip edilen Worldwide mesaj id
+
 async def find_existing_trend_message_id():
-    msgs = await client.get_messages(TARGET_CHANNEL_ID, limit=30)
-    for m in msgs:
-        if m.out and m.message and "Worldwide Top #Trends Diamonds Now" in m.message:
-            return m.id
-    return None
+    # Index zaten takip ediyor; sadece yeni mesajlar okunur
+    await contract_index.update(client, TARGET_CHANNEL_ID, cold_limit=30)
+    return contract_index.trend_msg_id
 
 async def send_trends_post():
-    contracts = await collect_contracts_from_channel(limit=150)
-    tokens = await pick_top_tokens(contracts)
+    # Her Worldwide döngüsü ayrı ölçülür; içindeki aşamalar source="worldwide" label'ı alır
+    token, started, result = metric_source.set("worldwide"), time.monotonic(), "error"
+    try:
+        result = await _send_trends_post()
+    finally:
+        metrics.observe("worldwide_cycle_seconds", time.monotonic() - started)
+        metrics.inc("worldwide_cycles_total", result=result)
+        profiler.check("worldwide", started)
+        metric_source.reset(token)
+
+async def _send_trends_post():
+    global TREND_MSG_ID, _trends_signature, _last_trends_post
+    # Sıralama canlı akış + hafif refresh ile güncel; boşsa bir kere tarama yap
+    if shared_trends: await shared_trends.pull(trend_ranker)
+    tokens = trend_ranker.top(TREND_TOP_K)
+    if not tokens:
+        tokens = await refresh_trends()
 
     if not tokens:
         log_info("Worldwide: no data, skipping post.")
-        return  # ❌ Artık mesaj atmayacak
-
-    banner = generate_worldwide_banner(tokens)
+        return "no_data"  # ❌ Artık mesaj atmayacak
+
+    signature = trends_signature(tokens)
+    if TRENDS_EDIT_IN_PLACE:
+        if TREND_MSG_ID is None: TREND_MSG_ID = await find_existing_trend_message_id()
+        if TREND_MSG_ID: trend_msg_ids.setdefault(TARGET_CHANNEL_ID, TREND_MSG_ID)
+        if trend_msg_ids and signature == _trends_signature:
+            log_info("Worldwide: top list unchanged, edit skipped.")
+            return "unchanged"
+
+    banner = await generate_worldwide_banner(tokens)
+    if banner is None:
+        log_error("Worldwide: banner render failed.")
+        return "render_failed"
     caption = build_trends_caption(tokens)
 
-    try:
-        await client.send_file(
-            TARGET_CHANNEL_ID,
-            file=banner,
-            caption=caption,
-            parse_mode="HTML",
-            link_preview=False
-        )
-        log_success("Worldwide: new message posted.")
-    except Exception as e:
-        log_error(f"Send error: {e}")
+    results = await destinations.publish(banner, caption, edit_ids=trend_msg_ids if TRENDS_EDIT_IN_PLACE else None)
+    for target, msg_id in results.items():
+        if msg_id: trend_msg_ids[target] = msg_id
+    TREND_MSG_ID = trend_msg_ids.get(TARGET_CHANNEL_ID, TREND_MSG_ID)
+    if any(results.values()):
+        _trends_signature, _last_trends_post = signature, time.time()
+        log_success(f"Worldwide: posted to {sum(1 for m in results.values() if m)}/{len(results)} destinations.")
+        return "posted"
+    return "send_failed"
 
 
 async def periodic_task():
-    # Bot ilk açıldığında hemen bir post atsın
-    await send_trends_post()
+    # Soğuk başlangıçta hemen post; snapshot'tan dönüldüyse son posttan TRENDS_POST_INTERVAL sonra
+    delay = _last_trends_post + TRENDS_POST_INTERVAL - time.time()
+    if delay > 0:
+        log_info(f"Worldwide: last post {TRENDS_POST_INTERVAL - delay:.0f}s ago, next in {delay:.0f}s.")
+        await asyncio.sleep(delay)
 
     while True:
         try:
             await send_trends_post()
         except Exception as e:
             log_error(f"Worldwide error: {e}")
+        log_info(f"Pipeline: {pipeline.stats()}")
+        log_info(f"Token cache: {token_cache.stats()}")
+        log_info(f"Dexscreener limiter: {dex_limiter.stats()}")
+        log_info(f"Image cache: {image_cache.stats()}")
+        log_info(f"Media uploads: {media_cache.stats()}")
+        log_info(f"Banner encoding: {render_pool.stats()}")
+        log_info(f"Destinations: {destinations.stats()}")
         # 🔥 Yarım saatte bir tekrar post at
-        await asyncio.sleep(1800)
+        await asyncio.sleep(TRENDS_POST_INTERVAL)
+
+
+class PostedStore:
+    # Son POSTED_COOLDOWN içinde paylaşılan contract'lar; Redis varsa instance'lar arası ortak
+    def __init__(self, cooldown=POSTED_COOLDOWN, max_entries=POSTED_MAX, path=POSTED_PATH, redis_url=REDIS_URL, prefix="lapad:posted:"):
+        self.cooldown = cooldown
+        self.max_entries = max_entries
+        self.path = path
+        self.redis = get_redis(redis_url) if redis_url else None
+        self.prefix = prefix
+        self.suppressed = 0
+        self._entries = OrderedDict()   # contract -> {chain: expires_at}
+        self._file = StateFile(path, self.dump)
+        self.load()
+
+    def load(self):
+        if not self.path: return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: self.restore(json.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log_error(f"Posted store unreadable, starting empty: {e}")
+
+    def restore(self, state):
+        now = time.time()
+        for contract, chains in sorted(state.items(), key=lambda kv: max(kv[1].values(), default=0)):
+            current = self._entries.setdefault(contract, {})
+            for chain, exp in chains.items():
+                if exp > max(now, current.get(chain, 0)): current[chain] = exp
+            if not current: del self._entries[contract]
+
+    def dump(self):
+        self.expire()
+        return dict(self._entries)
+
+    def save(self):
+        # claim/release başına tam dosya yazılmaz; crash'te son hal snapshot'tan gelir
+        self._file.mark()
+
+    def flush(self):
+        self._file.flush()
+
+    def expire(self, now=None):
+        now = now or time.time()
+        for contract in [c for c, chains in self._entries.items() if max(chains.values()) <= now]:
+            del self._entries[contract]
+        while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+
+    def recently_posted(self, contract, chain=None):
+        chains = self._entries.get(_addr_key(contract))
+        if not chains: return False
+        now = time.time()
+        if chain is None: return any(exp > now for exp in chains.values())
+        return chains.get(chain.lower(), 0) > now
+
+    async def seen(self, contract):
+        # Ağ işinden önce ucuz kontrol: önce bellek, sonra (varsa) Redis
+        if self.recently_posted(contract):
+            self.suppressed += 1
+            return True
+        if self.redis is not None:
+            try:
+                # Contract başına zset: üye = chain, skor = cooldown bitişi
+                if await self.redis.zcount(self.prefix + _addr_key(contract), time.time(), "+inf"):
+                    self.suppressed += 1
+                    return True
+            except Exception as e:
+                log_error(f"Redis posted check error: {e}")
+        return False
+
+    async def claim(self, contract, chain):
+        key, chain = _addr_key(contract), (chain or "").lower()
+        if self.recently_posted(key, chain):
+            self.suppressed += 1
+            return False
+        if self.redis is not None:
+            try:
+                # Claim (contract, chain) başına; seen() için contract zset'ine de yazılır
+                if not await self.redis.set(f"{self.prefix}{key}:{chain}", 1, nx=True, px=int(self.cooldown * 1000)):
+                    self.suppressed += 1
+                    return False
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.zadd(self.prefix + key, {chain: time.time() + self.cooldown})
+                    pipe.pexpire(self.prefix + key, int(self.cooldown * 1000))
+                    await pipe.execute()
+            except Exception as e:
+                log_error(f"Redis posted claim error: {e}")
+        self._entries.setdefault(key, {})[chain] = time.time() + self.cooldown
+        self._entries.move_to_end(key)
+        self.expire()
+        self.save()
+        return True
+
+    async def release(self, contract, chain):
+        # Gönderim başarısızsa tekrar denenebilsin
+        key, chain = _addr_key(contract), (chain or "").lower()
+        chains = self._entries.get(key)
+        if chains:
+            chains.pop(chain, None)
+            if not chains: del self._entries[key]
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.delete(f"{self.prefix}{key}:{chain}")
+                    pipe.zrem(self.prefix + key, chain)
+                    await pipe.execute()
+            except Exception as e:
+                log_error(f"Redis posted release error: {e}")
+        self.save()
+
+posted_store = PostedStore()
+
+class TokenPipeline:
+    # handler sadece kuyruğa atar; worker'lar fetch → filtre → render → gönderim yapar.
+    # Aynı contract kuyrukta/işlemdeyken tekrar gelirse tek işe birleştirilir.
+    def __init__(self, process, workers=PIPELINE_WORKERS, maxsize=PIPELINE_QUEUE_SIZE):
+        self.process = process
+        self.workers = max(1, workers)
+        self.queue = asyncio.Queue(maxsize)
+        self.inflight = {}      # contract -> job
+        self.processed = self.coalesced = self.failed = 0
+        self.wait_total = self.wait_max = 0.0
+        self._tasks = []
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks: t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, token, source=None):
+        self.start()
+        key = _addr_key(token)
+        job = self.inflight.get(key)
+        if job is not None:
+            job["sources"].add(source)
+            self.coalesced += 1
+            return False
+        job = self.inflight[key] = {"token": token, "source": source, "sources": {source}, "enqueued": time.monotonic()}
+        try:
+            await self.queue.put(job)   # kuyruk doluysa burada bekler (backpressure)
+        except BaseException:
+            self.inflight.pop(key, None)
+            raise
+        return True
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            started = time.monotonic()
+            wait = started - job["enqueued"]
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            source = str(job["source"])
+            ctx = metric_source.set(source)     # fetch/render/send aşamaları bu kanala yazılır
+            metrics.observe("pipeline_wait_seconds", wait, source=source)
+            try:
+                await self.process(job["token"], job["sources"])
+            except Exception as e:
+                self.failed += 1
+                metrics.inc("pipeline_failures_total", source=source)
+                log_error(f"Pipeline error for {job['token']}: {e!r}")
+            finally:
+                metrics.observe("job_seconds", time.monotonic() - job["enqueued"], source=source)
+                profiler.check(f"token:{job['token']}", started)
+                metric_source.reset(ctx)
+                self.processed += 1
+                self.inflight.pop(_addr_key(job["token"]), None)
+                self.queue.task_done()
+
+    def stats(self):
+        return {
+            "depth": self.queue.qsize(), "inflight": len(self.inflight), "processed": self.processed,
+            "coalesced": self.coalesced, "failed": self.failed,
+            "avg_wait": round(self.wait_total / self.processed, 3) if self.processed else 0.0,
+            "max_wait": round(self.wait_max, 3),
+        }
+
+async def process_token(token, sources=None):
+    with metrics.timer("fetch"):
+        pairs = await fetch_token_info(token, priority=PRIORITY_REALTIME)
+    if not pairs: 
+        log_error("No DexScreener result.")
+        return
+    for pair in pairs:
+        liquidity_usd = pair.get("liquidity", {}).get("usd", 0) or 0
+        if liquidity_usd < 10000: 
+            log_info("Low liquidity, skipped.")
+            continue
+        chain = pair.get("chainId") or ""
+        if not await posted_store.claim(token, chain):
+            log_info(f"Already posted recently, skipped: {token}")
+            break
+        media, msg = await format_pair_message(pair)
+        if not media or not msg: 
+            log_error("Media/message not created.")
+            await posted_store.release(token, chain)
+            break
+        try:
+            results = await destinations.publish(media, msg)
+        except Exception as e:
+            log_error(f"Publish error: {e}")
+            results = {}
+        if any(results.values()):
+            # Trend sıralamasına yalnızca filtreden geçip gönderilen pair girer
+            if shared_trends: await shared_trends.offer(trend_ranker, pair)
+            else: trend_ranker.offer(pair)
+            log_success(f"Message sent: {token}")
+        else:
+            await posted_store.release(token, chain)
+        break
+
+pipeline = TokenPipeline(process_token)
+
+metrics.register("pipeline", pipeline.stats)
+metrics.register("token_cache", token_cache.stats)
+metrics.register("dex_limiter", dex_limiter.stats)
+metrics.register("image_cache", image_cache.stats)
+metrics.register("media_cache", media_cache.stats)
+metrics.register("render", render_pool.stats, label="layout")
+metrics.register("destination", destinations.stats, label="destination")
+
+def snapshot_state():
+    return {
+        "version": 1, "saved_at": time.time(),
+        "token_cache": token_cache.dump(),
+        "trends": trend_ranker.dump(),
+        "contract_index": contract_index.dump(),
+        "posted": posted_store.dump(),
+        "trend_msg_id": TREND_MSG_ID, "trend_msg_ids": trend_msg_ids,
+        "trends_signature": _trends_signature, "last_trends_post": _last_trends_post,
+    }
+
+def write_snapshot(data, path=SNAPSHOT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f: f.write(gzip.compress(data, compresslevel=6))
+    os.replace(tmp, path)
 
+def encode_snapshot():
+    # JSON loop üzerinde (state değişmeden) çıkarılır; sıkıştırma + yazma thread'de olabilir
+    return json.dumps(snapshot_state(), separators=(",", ":")).encode()
+
+def save_snapshot(path=SNAPSHOT_PATH):
+    write_snapshot(encode_snapshot(), path)
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    global TREND_MSG_ID, _trends_signature, _last_trends_post
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f: state = json.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        log_error(f"Snapshot unreadable, cold start: {e}")
+        return False
+    if state.get("version") != 1:
+        log_error(f"Snapshot version {state.get('version')} not supported, cold start.")
+        return False
+    token_cache.restore(state.get("token_cache") or [])
+    trend_ranker.restore(state.get("trends") or [])
+    index = state.get("contract_index") or {}
+    # Index kendi dosyasını da tutuyor; hangisi daha ilerideyse o
+    if index.get("last_id", 0) > contract_index.last_id: contract_index.restore(index)
+    posted_store.restore(state.get("posted") or {})
+    TREND_MSG_ID = TREND_MSG_ID or state.get("trend_msg_id")
+    for target, msg_id in (state.get("trend_msg_ids") or {}).items(): trend_msg_ids.setdefault(target, msg_id)
+    _trends_signature = state.get("trends_signature")
+    _last_trends_post = state.get("last_trends_post") or 0.0
+    log_success(f"Warm start from snapshot ({time.time() - state.get('saved_at', 0):.0f}s old): "
+                f"{len(token_cache.local)} pairs, {len(trend_ranker)} trends, {len(contract_index.contracts)} contracts, "
+                f"{len(posted_store._entries)} posted.")
+    return True
+
+def _decode_fields(fields):
+    return {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v) for k, v in fields.items()}
+
+class RedisJobQueue:
+    # Ölçekli mod: ingest XADD ile stream'e yazar, worker'lar consumer group ile okuyup iş bitince XACK eder.
+    # Hata veren iş attempts+1 ile sona eklenir; worker ölürse JOB_CLAIM_IDLE sonra XAUTOCLAIM ile başkasına geçer.
+    # JOB_MAX_ATTEMPTS'i aşan iş dead-letter stream'e taşınır.
+    def __init__(self, url=REDIS_URL, stream=JOB_STREAM, group=JOB_GROUP, dead_stream=JOB_DEAD_STREAM,
+                 consumer=INSTANCE_ID, max_attempts=JOB_MAX_ATTEMPTS, claim_idle=JOB_CLAIM_IDLE, dedup_ttl=JOB_DEDUP_TTL):
+        self.redis = get_redis(url)
+        self.stream, self.group, self.dead_stream = stream, group, dead_stream
+        self.consumer = consumer
+        self.max_attempts = max(1, max_attempts)
+        self.claim_idle = claim_idle
+        self.dedup_ttl = dedup_ttl
+        self.submitted = self.coalesced = self.processed = self.retried = self.claimed = self.dead = 0
+        self._running = set()
+        self._group_ready = False
+
+    async def ensure_group(self):
+        if self._group_ready: return
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e): raise
+        self._group_ready = True
+
+    async def submit(self, token, source=None):
+        # TokenPipeline.submit ile aynı imza; handler değişmeden stream'e yazar
+        if self.dedup_ttl > 0 and not await self.redis.set(f"{self.stream}:queued:{_addr_key(token)}", 1, nx=True, px=int(self.dedup_ttl * 1000)):
+            self.coalesced += 1
+            return False
+        await self.redis.xadd(self.stream, {"token": token, "source": str(source), "attempts": 0, "ts": time.time()},
+                              maxlen=JOB_STREAM_MAX, approximate=True)
+        self.submitted += 1
+        metrics.inc("jobs_submitted_total", source=source)
+        return True
+
+    async def consume(self, process, concurrency=PIPELINE_WORKERS):
+        await self.ensure_group()
+        next_claim = 0.0
+        log_success(f"Worker {self.consumer} consuming {self.stream} ({self.group}).")
+        while True:
+            free = concurrency - len(self._running)
+            if free <= 0:
+                await asyncio.wait(self._running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                entries = []
+                if time.monotonic() >= next_claim:
+                    next_claim = time.monotonic() + self.claim_idle / 2
+                    entries = await self._claim(free)
+                if not entries:
+                    resp = await self.redis.xreadgroup(self.group, self.consumer, {self.stream: ">"}, count=free, block=2000)
+                    entries = resp[0][1] if resp else []
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_error(f"Job stream read error: {e!r}")
+                await asyncio.sleep(1)
+                continue
+            for entry_id, fields in entries:
+                task = asyncio.create_task(self._handle(process, entry_id, _decode_fields(fields)))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _claim(self, count):
+        # Sahibi ölmüş/takılmış işler; teslim sayısı sınırı aşanlar (worker'ı düşüren iş) dead-letter'a
+        resp = await self.redis.xautoclaim(self.stream, self.group, self.consumer, int(self.claim_idle * 1000), "0-0", count=count)
+        out = []
+        for entry_id, fields in resp[1]:
+            if not fields: continue
+            pending = await self.redis.xpending_range(self.stream, self.group, entry_id, entry_id, 1)
+            delivered = pending[0]["times_delivered"] if pending else 1
+            fields = _decode_fields(fields)
+            if delivered > self.max_attempts:
+                await self._dead(entry_id, fields, f"not acknowledged after {delivered - 1} deliveries")
+                continue
+            self.claimed += 1
+            metrics.inc("jobs_claimed_total")
+            out.append((entry_id, fields))
+        return out
+
+    async def _handle(self, process, entry_id, fields):
+        token, source = fields["token"], fields.get("source")
+        attempts = int(fields.get("attempts") or 0) + 1
+        ctx = metric_source.set(source or "-")
+        started = time.monotonic()
+        queued_at = float(fields.get("ts") or time.time())
+        metrics.observe("pipeline_wait_seconds", max(0.0, time.time() - queued_at), source=source or "-")
+        try:
+            await process(token, {source})
+        except Exception as e:
+            log_error(f"Job {token} failed (attempt {attempts}/{self.max_attempts}): {e!r}")
+            try:
+                if attempts >= self.max_attempts:
+                    await self._dead(entry_id, fields, repr(e))
+                    return
+                await self.redis.xadd(self.stream, dict(fields, attempts=attempts), maxlen=JOB_STREAM_MAX, approximate=True)
+                self.retried += 1
+                metrics.inc("jobs_retried_total", source=source)
+            except Exception as e2:
+                # Yeniden kuyruğa alınamadı: ack yok, XAUTOCLAIM sonra tekrar dener
+                log_error(f"Job {token} could not be requeued: {e2!r}")
+                return
+        finally:
+            metrics.observe("job_seconds", max(0.0, time.time() - queued_at), source=source or "-")
+            profiler.check(f"token:{token}", started)
+            metric_source.reset(ctx)
+        try:
+            await self.redis.xack(self.stream, self.group, entry_id)
+            self.processed += 1
+        except Exception as e:
+            log_error(f"Job ack error for {token}: {e!r}")
+
+    async def _dead(self, entry_id, fields, reason):
+        await self.redis.xadd(self.dead_stream, dict(fields, error=reason[:500], failed_at=time.time(), consumer=self.consumer),
+                              maxlen=JOB_STREAM_MAX, approximate=True)
+        await self.redis.xack(self.stream, self.group, entry_id)
+        self.dead += 1
+        metrics.inc("jobs_dead_total")
+        log_error(f"Job {fields.get('token')} moved to {self.dead_stream}: {reason}")
+
+    def stats(self):
+        return {"submitted": self.submitted, "coalesced": self.coalesced, "processed": self.processed,
+                "running": len(self._running), "retried": self.retried, "claimed": self.claimed, "dead": self.dead}
+
+_RENEW_LUA = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+_RELEASE_LUA = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+class LeaderLease:
+    # SET NX PX ile tek lider; lider TTL/3'te bir kendi kimliğiyle süreyi uzatır.
+    # Uzatamazsa (Redis hatası dahil) lider görevlerini iptal eder, başka instance devralır.
+    def __init__(self, url=REDIS_URL, key=LEADER_KEY, ttl=LEADER_TTL, identity=INSTANCE_ID):
+        self.redis = get_redis(url)
+        self.key = key
+        self.ttl = ttl
+        self.identity = identity
+        self.is_leader = False
+        self.elections = 0
+
+    async def _hold(self):
+        px = int(self.ttl * 1000)
+        if self.is_leader:
+            return bool(await self.redis.eval(_RENEW_LUA, 1, self.key, self.identity, px))
+        return bool(await self.redis.set(self.key, self.identity, nx=True, px=px))
+
+    async def run(self, *factories):
+        tasks = []
+        try:
+            while True:
+                try:
+                    held = await self._hold()
+                except Exception as e:
+                    log_error(f"Leader lease error: {e!r}")
+                    held = False
+                if held and not tasks:
+                    self.elections += 1
+                    log_success(f"{self.identity} is leader ({self.key}).")
+                    tasks = [asyncio.create_task(f()) for f in factories]
+                elif not held and tasks:
+                    log_error(f"{self.identity} lost leadership, stopping leader tasks.")
+                    for t in tasks: t.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    tasks = []
+                self.is_leader = held
+                metrics.inc("leader_checks_total", leader=int(held))
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            for t in tasks: t.cancel()
+
+    async def release(self):
+        if self.is_leader:
+            await self.redis.eval(_RELEASE_LUA, 1, self.key, self.identity)
+            self.is_leader = False
+
+    def stats(self):
+        return {"leader": int(self.is_leader), "elections": self.elections}
+
+async def snapshot_task(interval=SNAPSHOT_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(write_snapshot, encode_snapshot())
+        except Exception as e:
+            log_error(f"Snapshot error: {e}")
 
-@client.on(events.NewMessage(chats=list(CHANNEL_PARSERS.keys())))
 async def handler(event):
     chat_id = event.chat_id
     parser_name = CHANNEL_PARSERS.get(chat_id)
     parser_func = globals().get(parser_name)
     if not callable(parser_func): return
+    metrics.inc("messages_total", source=chat_id)
     try:
-        tokens = parser_func(event) if "event" in parser_func.__code__.co_varnames else parser_func(event.message.message or "")
+        with metrics.timer("parse", source=chat_id):
+            tokens = parser_func(event) if "event" in parser_func.__code__.co_varnames else parser_func(event.message.message or "")
     except Exception as e:
         log_error(f"Parser error: {e}")
         return
     if not tokens: return
+    metrics.inc("tokens_found_total", len(tokens), source=chat_id)
 
     for token in tokens:
         log_info(f"Token found: {token}")
-        pairs = fetch_token_info(token)
-        if not pairs: 
-            log_error("No DexScreener result.")
+        if await posted_store.seen(token):
+            metrics.inc("tokens_skipped_total", source=chat_id, reason="posted")
+            log_info(f"Already posted recently, skipped: {token}")
             continue
-        for pair in pairs:
-            liquidity_usd = pair.get("liquidity", {}).get("usd", 0) or 0
-            if liquidity_usd < 10000: 
-                log_info("Low liquidity, skipped.")
-                continue
-            media, msg = format_pair_message(pair)
-            if not media or not msg: 
-                log_error("Media/message not created.")
-                break
-            try:
-                await client.send_file(
-                    TARGET_CHANNEL_ID,
-                    file=media,
-                    caption=msg,
-                    parse_mode="HTML",
-                    link_preview=False
-                )
-                log_success(f"Message sent: {token}")
-            except Exception as e:
-                log_error(f"Send error: {e}")
-            break
+        await pipeline.submit(token, chat_id)
+
+
+def create_client(listen=True):
+    global client
+    if not (api_id and api_hash and session_string):
+        raise RuntimeError("API_ID, API_HASH and SESSION_STRING must be set")
+    client = TelegramClient(StringSession(session_string), api_id, api_hash)
+    if listen: client.add_event_handler(handler, events.NewMessage(chats=list(CHANNEL_PARSERS.keys())))
+    return client
 
 
 if __name__ == "__main__":
-    log_success("Bot starting...")
+    # single: her şey tek process'te | ingest: kanalları dinler, işleri Redis stream'e yazar |
+    # worker: stream'den işleri alıp fetch/render/gönderim yapar. Worldwide görevlerini sadece lider çalıştırır.
+    # Her process kendi SESSION_STRING'i ve STATE_DIR'i ile başlatılmalı; posted/token cache ve canlı trend kayıtları Redis'te ortak.
+    mode = sys.argv[1] if len(sys.argv) > 1 else BOT_MODE
+    if mode not in ("single", "ingest", "worker"):
+        raise SystemExit(f"Unknown mode {mode!r}: use single, ingest or worker")
+    if mode != "single" and not REDIS_URL:
+        raise SystemExit(f"{mode} mode needs REDIS_URL")
+    log_success(f"Bot starting ({mode}, {INSTANCE_ID})...")
+    create_client(listen=mode != "worker")
+    get_render_context()
+    render_pool.start()
+    profiler.start()
+    load_snapshot()     # handler'lar çalışmadan önce
+    if METRICS_PORT: client.loop.run_until_complete(start_metrics_server())
     client.start()
-    client.loop.create_task(periodic_task())
-    client.run_until_disconnected()
+    lease = None
+    if mode == "single":
+        client.loop.create_task(periodic_task())
+        client.loop.create_task(trend_refresh_task())
+    else:
+        lease = LeaderLease()
+        metrics.register("leader", lease.stats)
+        client.loop.create_task(lease.run(periodic_task, trend_refresh_task))
+        jobs = RedisJobQueue()
+        metrics.register("jobs", jobs.stats)
+        shared_trends = SharedTrends()
+        metrics.register("shared_trends", shared_trends.stats)
+        if mode == "ingest": pipeline = jobs      # handler pipeline.submit → XADD
+        else: client.loop.create_task(jobs.consume(process_token))
+    client.loop.create_task(snapshot_task())
+    # Deploy'da gelen SIGTERM da finally'e düşsün
+    client.loop.add_signal_handler(signal.SIGTERM, lambda: client.loop.create_task(client.disconnect()))
+    try:
+        client.run_until_disconnected()
+    finally:
+        save_snapshot()
+        image_cache.flush()
+        posted_store.flush()
+        contract_index.flush()
+        if lease: client.loop.run_until_complete(lease.release())
+        client.loop.run_until_complete(close_http_session())
+        render_pool.shutdown()
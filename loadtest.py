@@ -0,0 +1,366 @@
+import os
+import sys
+import copy
+import json
+import time
+import re
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+from types import SimpleNamespace
+
+# Bot'un kendi render pool'u (process) ile ölçülür; state/cache geçici dizinde
+os.environ.setdefault("IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="lapad-load-img-"))
+os.environ.setdefault("STATE_DIR", tempfile.mkdtemp(prefix="lapad-load-state-"))
+os.environ.setdefault("RENDER_POOL", "process")
+
+from aiohttp import web
+import contracts
+from bench import load_fixtures, make_event
+
+
+def b58encode(data):
+    n = int.from_bytes(data, "big")
+    out = ""
+    while n:
+        n, r = divmod(n, 58)
+        out = contracts.BASE58_ALPHABET[r] + out
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + out
+
+
+def new_address(like):
+    return "0x" + os.urandom(20).hex() if like.startswith("0x") else b58encode(os.urandom(32))
+
+
+class FakeDexScreener:
+    # /latest/dex/tokens/ ve /search yanıtlarını fixture pair'lerinden üretir; logo/header da buradan servis edilir
+    def __init__(self, pairs, logo, header, latency=0.15, rate_429=0.0, pairs_per_token=1,
+                 header_rate=0.25, logo_variety=50):
+        self.pairs, self.logo, self.header = pairs, logo, header
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.pairs_per_token = max(1, pairs_per_token)
+        self.header_rate = header_rate
+        self.logo_variety = max(1, logo_variety)
+        self.requests = self.throttled = self.bytes_sent = 0
+        self.base_url = None
+        self._runner = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/latest/dex/tokens/{addresses}", self.tokens)
+        app.router.add_get("/latest/dex/search/", self.search)
+        app.router.add_get("/logo/{name}", self.image)
+        app.router.add_get("/header/{name}", self.image)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner: await self._runner.cleanup()
+
+    async def _delay(self):
+        if self.latency > 0: await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+    def pairs_for(self, address):
+        h = hash(address)
+        out = []
+        for i in range(self.pairs_per_token):
+            pair = copy.deepcopy(self.pairs[(h + i) % len(self.pairs)])
+            pair["baseToken"]["address"] = address
+            pair["url"] = f"https://dexscreener.com/{pair['chainId']}/{address.lower()}"
+            pair["priceChange"] = {k: abs(v) for k, v in pair["priceChange"].items()}
+            info = pair.setdefault("info", {})
+            info["imageUrl"] = f"{self.base_url}/logo/{h % self.logo_variety}.jpg"
+            info.pop("header", None)
+            if random.random() < self.header_rate: info["header"] = f"{self.base_url}/header/{h % self.logo_variety}.jpg"
+            if i: pair["liquidity"] = {"usd": 500}     # ek pair'ler düşük likiditeli, sadece payload büyütür
+            out.append(pair)
+        return out
+
+    def _respond(self, payload):
+        body = json.dumps(payload).encode()
+        self.bytes_sent += len(body)
+        return web.Response(body=body, content_type="application/json")
+
+    async def _throttle(self):
+        self.requests += 1
+        await self._delay()
+        if random.random() < self.rate_429:
+            self.throttled += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        return None
+
+    async def tokens(self, request):
+        resp = await self._throttle()
+        if resp is not None: return resp
+        pairs = [p for a in request.match_info["addresses"].split(",") if a for p in self.pairs_for(a)]
+        return self._respond({"schemaVersion": "1.0.0", "pairs": pairs})
+
+    async def search(self, request):
+        resp = await self._throttle()
+        if resp is not None: return resp
+        q = request.query.get("q", "")
+        return self._respond({"schemaVersion": "1.0.0", "pairs": self.pairs_for(q) if q else []})
+
+    async def image(self, request):
+        await self._delay()
+        data = self.header if request.path.startswith("/header/") else self.logo
+        self.bytes_sent += len(data)
+        return web.Response(body=data, content_type="image/jpeg")
+
+    def stats(self):
+        return {"requests": self.requests, "throttled": self.throttled, "bytes_sent": self.bytes_sent}
+
+
+class FakeTelegram:
+    # Telethon client yerine: upload/send/edit gecikmeli kabul edilir, gönderilen her caption kaydedilir
+    def __init__(self, send_latency=0.05, upload_latency=0.05, on_post=None):
+        self.send_latency = send_latency
+        self.upload_latency = upload_latency
+        self.on_post = on_post
+        self.uploads = self.sent = self.edits = 0
+        self._next_id = 1000
+
+    async def upload_file(self, file, file_name=None, **kw):
+        await asyncio.sleep(self.upload_latency)
+        self.uploads += 1
+        return SimpleNamespace(name=file_name, size=len(file.getvalue()))
+
+    async def send_file(self, target, file=None, caption=None, **kw):
+        await asyncio.sleep(self.send_latency)
+        self.sent += 1
+        self._next_id += 1
+        if self.on_post: self.on_post(caption or "")
+        return SimpleNamespace(id=self._next_id)
+
+    async def edit_message(self, target, message_id, text=None, file=None, **kw):
+        await asyncio.sleep(self.send_latency)
+        self.edits += 1
+        return SimpleNamespace(id=message_id)
+
+    async def iter_messages(self, channel, limit=None, min_id=0, **kw):
+        return
+        yield
+
+
+class EventSource:
+    # Fixture mesajlarını şablon olarak kullanır; her olayda contract yeni bir adresle değiştirilir
+    def __init__(self, messages, duplicate_rate=0.0):
+        self.templates = {}
+        for m in messages:
+            found = contracts.scan_contracts(m["text"] + " " + " ".join(e.get("url", "") for e in m.get("entities", [])))
+            if len(found) == 1 and m["chat_id"] in contracts.CHANNEL_PARSERS:
+                self.templates.setdefault(m["chat_id"], []).append((m, found[0]))
+        missing = [c for c in contracts.CHANNEL_PARSERS if c not in self.templates]
+        if missing:
+            # Şablonu olmayan kanal sessizce atlanırsa yük dağılımı gerçek akışı yansıtmaz
+            raise ValueError(f"no fixture message with a single contract for channels: {missing}")
+        self.channels = list(contracts.CHANNEL_PARSERS)
+        self.duplicate_rate = duplicate_rate
+        self.recent = []
+        self._n = 0
+
+    def next(self):
+        chat_id = self.channels[self._n % len(self.channels)]
+        template, old = self.templates[chat_id][(self._n // len(self.channels)) % len(self.templates[chat_id])]
+        self._n += 1
+        same_kind = [a for a in self.recent[-50:] if a.startswith("0x") == old.startswith("0x")]
+        if same_kind and random.random() < self.duplicate_rate:
+            address = random.choice(same_kind)
+        else:
+            address = new_address(old)
+            self.recent.append(address)
+        m = copy.deepcopy(template)
+        swap = re.compile(re.escape(old), re.IGNORECASE if old.startswith("0x") else 0)
+        m["text"] = swap.sub(address, m["text"])
+        for e in m.get("entities", []):
+            if "url" in e: e["url"] = swap.sub(address, e["url"])
+        return address, make_event(m)
+
+
+class LoadRun:
+    def __init__(self, source, rate, duration, burst):
+        self.source = source
+        self.rate, self.duration, self.burst = rate, duration, max(1, burst)
+        self.first_seen = {}    # adres anahtarı -> ilk olay zamanı
+        self.done = set()       # post edilmiş anahtarlar; sonradan gelen tekrarlar bekleyen sayılmaz
+        self.latencies = []
+        self.posted_at = []
+        self.events = 0
+        self.depth_max = self.inflight_max = 0
+        self.errors = 0
+        self._tasks = set()
+
+    def on_post(self, caption):
+        now = time.monotonic()
+        for c in contracts.scan_contracts(caption):
+            key = contracts._addr_key(c)
+            t0 = self.first_seen.pop(key, None)
+            if t0 is not None:
+                self.done.add(key)
+                self.latencies.append(now - t0)
+                self.posted_at.append(now)
+                return
+
+    async def sample(self):
+        while True:
+            self.depth_max = max(self.depth_max, contracts.pipeline.queue.qsize())
+            self.inflight_max = max(self.inflight_max, len(contracts.pipeline.inflight))
+            await asyncio.sleep(0.1)
+
+    async def inject(self):
+        interval = self.burst / self.rate
+        start = time.monotonic()
+        for i in range(max(1, int(self.rate * self.duration / self.burst))):
+            delay = start + i * interval - time.monotonic()
+            if delay > 0: await asyncio.sleep(delay)
+            for _ in range(self.burst):
+                address, event = self.source.next()
+                key = contracts._addr_key(address)
+                if key not in self.done: self.first_seen.setdefault(key, time.monotonic())
+                self.events += 1
+                # Telethon her update için ayrı task açar
+                task = asyncio.create_task(contracts.handler(event))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def drain(self, timeout):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            if not self._tasks and not contracts.pipeline.inflight: return True
+            await asyncio.sleep(0.05)
+        return False
+
+
+def rusage():
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime, max(own.ru_maxrss, children.ru_maxrss)
+
+
+async def run(args):
+    messages, pairs, logo, header = load_fixtures()
+    server = FakeDexScreener(pairs, logo, header, latency=args.dex_latency, rate_429=args.rate_429,
+                             pairs_per_token=args.pairs_per_token, header_rate=args.header_rate,
+                             logo_variety=args.logo_variety)
+    contracts.dex.base_url = await server.start()
+    source = EventSource(messages, duplicate_rate=args.duplicate_rate)
+    load = LoadRun(source, args.rate, args.duration, args.burst)
+    contracts.client = FakeTelegram(args.send_latency, args.upload_latency, on_post=load.on_post)
+    if args.send_interval is not None:
+        for d in contracts.destinations.destinations.values(): d.min_interval = args.send_interval
+    if not args.verbose:
+        def count_error(msg): load.errors += 1
+        contracts.log_success = contracts.log_info = lambda msg: None
+        contracts.log_error = count_error
+    contracts.get_render_context()
+    contracts.render_pool.start()
+    contracts.profiler.start()
+
+    cpu0, child0, _ = rusage()
+    sampler = asyncio.create_task(load.sample())
+    trends = asyncio.create_task(trends_loop(args.trends_every)) if args.trends_every > 0 else None
+    started = time.monotonic()
+    try:
+        await load.inject()
+        injected = time.monotonic()
+        drained = await load.drain(args.drain_timeout)
+        finished = time.monotonic()
+    finally:
+        sampler.cancel()
+        if trends: trends.cancel()
+        await contracts.pipeline.stop()
+        contracts.image_cache.flush()
+        contracts.posted_store.flush()
+        contracts.contract_index.flush()
+        await contracts.close_http_session()
+        await server.stop()
+        contracts.render_pool.shutdown(wait=True)   # worker'lar toplanınca RUSAGE_CHILDREN'a yansır
+    cpu1, child1, maxrss = rusage()
+
+    lat = sorted(load.latencies)
+    ms = lambda v: round(v * 1000, 1) if v is not None else None
+    window = (load.posted_at[-1] - started) if load.posted_at else 0
+    cpu = (cpu1 - cpu0) + (child1 - child0)
+    return {
+        "events": load.events,
+        "offered_per_min": round(args.rate * 60, 1),
+        "posted": len(lat),
+        "not_posted": len(load.first_seen),
+        "drained": drained,
+        "inject_s": round(injected - started, 2),
+        "drain_s": round(finished - injected, 2),
+        "posts_per_min": round(len(lat) / window * 60, 1) if window else 0.0,
+        "latency_ms": {"p50": ms(contracts.percentile(lat, 0.5)), "p95": ms(contracts.percentile(lat, 0.95)),
+                       "p99": ms(contracts.percentile(lat, 0.99)), "max": ms(lat[-1] if lat else None)},
+        "queue": {"depth_max": load.depth_max, "inflight_max": load.inflight_max, **contracts.pipeline.stats()},
+        "cpu_s": round(cpu, 2),
+        "cpu_pct": round(cpu / (finished - started) * 100, 1),
+        "max_rss_mb": round(maxrss / 1024, 1),      # Linux: ru_maxrss KB
+        "errors_logged": load.errors,
+        "dexscreener": {**server.stats(), "limiter": contracts.dex_limiter.stats()},
+        "telegram": {"uploads": contracts.client.uploads, "sent": contracts.client.sent, "edits": contracts.client.edits},
+        "caches": {"token": contracts.token_cache.stats(), "image": contracts.image_cache.stats(),
+                   "media": contracts.media_cache.stats()},
+    }
+
+
+async def trends_loop(every):
+    while True:
+        await asyncio.sleep(every)
+        try:
+            await contracts.send_trends_post()
+        except Exception as e:
+            contracts.log_error(f"Worldwide error: {e}")
+
+
+def print_report(r):
+    lat = r["latency_ms"]
+    print(f"events        {r['events']} offered at {r['offered_per_min']}/min over {r['inject_s']}s (drain {r['drain_s']}s{'' if r['drained'] else ', TIMED OUT'})")
+    print(f"posted        {r['posted']} ({r['not_posted']} not posted) → {r['posts_per_min']} posts/min")
+    print(f"latency ms    p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    q = r["queue"]
+    print(f"queue         depth max {q['depth_max']}  inflight max {q['inflight_max']}  avg wait {q['avg_wait']}s  max wait {q['max_wait']}s  coalesced {q['coalesced']}")
+    print(f"cpu           {r['cpu_s']}s ({r['cpu_pct']}% of wall)   max rss {r['max_rss_mb']} MB   errors {r['errors_logged']}")
+    d = r["dexscreener"]
+    print(f"dexscreener   {d['requests']} requests, {d['throttled']} throttled, {d['bytes_sent'] // 1024} KB   limiter {d['limiter']}")
+    print(f"telegram      {r['telegram']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end load test against a local fake DexScreener and Telegram sink.")
+    parser.add_argument("--rate", type=float, default=2.0, help="events per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="injection window in seconds")
+    parser.add_argument("--burst", type=int, default=1, help="events per burst (spread across channels)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="fraction of events repeating a recent contract")
+    parser.add_argument("--dex-latency", type=float, default=0.15, help="mean fake DexScreener latency (s)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of API requests answered with 429")
+    parser.add_argument("--pairs-per-token", type=int, default=1, help="pairs returned per token (payload size)")
+    parser.add_argument("--header-rate", type=float, default=0.25, help="fraction of pairs with a header image")
+    parser.add_argument("--logo-variety", type=int, default=50, help="distinct logo/header URLs")
+    parser.add_argument("--send-latency", type=float, default=0.05, help="fake send_file/edit_message latency (s)")
+    parser.add_argument("--upload-latency", type=float, default=0.05, help="fake upload_file latency (s)")
+    parser.add_argument("--send-interval", type=float, default=None, help="override DESTINATION_MIN_INTERVAL")
+    parser.add_argument("--trends-every", type=float, default=0.0, help="run a Worldwide post every N seconds (0 = off)")
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--metrics-out", metavar="PATH", help="write the final Prometheus metrics snapshot")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own log output")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    if args.metrics_out:
+        with open(args.metrics_out, "w", encoding="utf-8") as f: f.write(contracts.metrics.render())
+    if args.json: print(json.dumps(report, indent=2))
+    else: print_report(report)
+    return 0 if report["drained"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import tempfile
+
+# Gerçek bir Redis'e karşı ölçekli mod kontrolü; REDIS_URL yoksa atlanır.
+# Tüm anahtarlar rastgele bir önek altında, çıkışta silinir.
+os.environ.setdefault("IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="lapad-redis-img-"))
+os.environ.setdefault("STATE_DIR", tempfile.mkdtemp(prefix="lapad-redis-state-"))
+
+import contracts
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+
+class CheckFailed(AssertionError):
+    pass
+
+
+def expect(cond, message):
+    if not cond: raise CheckFailed(message)
+
+
+async def wait_until(pred, timeout, message):
+    end = time.monotonic() + timeout
+    while not pred():
+        if time.monotonic() > end: raise CheckFailed(f"timed out after {timeout:.0f}s: {message}")
+        await asyncio.sleep(0.05)
+
+
+def make_queue(prefix, name, **kwargs):
+    return contracts.RedisJobQueue(url=REDIS_URL, stream=f"{prefix}:{name}", group=f"{prefix}:{name}:group",
+                                   dead_stream=f"{prefix}:{name}:dead", **kwargs)
+
+
+async def run_consumer(queue, process, until, timeout, message, concurrency=2):
+    task = asyncio.create_task(queue.consume(process, concurrency=concurrency))
+    try:
+        await wait_until(lambda: until() or task.done(), timeout, message)
+        if task.done(): task.result()       # consume içinden çıkan hata
+    finally:
+        task.cancel()
+        await asyncio.gather(task, *queue._running, return_exceptions=True)
+
+
+async def check_roundtrip(prefix):
+    # submit → XREADGROUP → process → XACK; aynı contract dedup süresi içinde tekrar kuyruğa girmez
+    q = make_queue(prefix, "roundtrip")
+    done = []
+
+    async def process(token, sources):
+        done.append((token, sources))
+
+    await q.ensure_group()
+    submitted = [await q.submit(t, -100) for t in ("0xAbC1", "0xabc1", "Sol1")]
+    expect(submitted == [True, False, True], f"dedup: {submitted}")
+    await run_consumer(q, process, lambda: q.processed >= 2, 10, "two jobs processed")
+    expect(sorted(t for t, _ in done) == ["0xAbC1", "Sol1"], f"processed {done}")
+    expect(all(s == {"-100"} for _, s in done), f"sources {done}")
+    pending = await q.redis.xpending(q.stream, q.group)
+    expect(pending["pending"] == 0, f"unacked entries: {pending}")
+
+
+async def check_retry_dead_letter(prefix):
+    # Hata → attempts+1 ile yeniden XADD; max_attempts'e ulaşan dead-letter stream'e
+    q = make_queue(prefix, "retry", max_attempts=2, dedup_ttl=0)
+    calls = {}
+
+    async def process(token, sources):
+        calls[token] = calls.get(token, 0) + 1
+        if token == "bad" or (token == "flaky" and calls[token] == 1): raise RuntimeError(f"{token} failed")
+
+    await q.ensure_group()
+    for t in ("bad", "flaky"): await q.submit(t, -100)
+    await run_consumer(q, process, lambda: q.dead >= 1 and calls.get("flaky", 0) >= 2, 10, "retry and dead-letter")
+    expect(calls == {"bad": 2, "flaky": 2}, f"attempts {calls}")
+    expect(q.retried == 2, f"retried {q.retried}")
+    dead = await q.redis.xrange(q.dead_stream)
+    expect([f[b"token"] for _, f in dead] == [b"bad"], f"dead-letter {dead}")
+    expect(b"bad failed" in dead[0][1][b"error"], f"dead-letter reason {dead[0][1]}")
+    pending = await q.redis.xpending(q.stream, q.group)
+    expect(pending["pending"] == 0, f"unacked entries: {pending}")
+
+
+async def check_orphan_claim(prefix):
+    # Okuyup ack'lemeden ölen worker'ın işi claim_idle sonra XAUTOCLAIM ile devralınır
+    q = make_queue(prefix, "claim", claim_idle=1.0)
+    done = []
+
+    async def process(token, sources):
+        done.append(token)
+
+    await q.ensure_group()
+    await q.submit("orphan", -100)
+    taken = await q.redis.xreadgroup(q.group, "crashed-worker", {q.stream: ">"}, count=10)
+    expect(taken and len(taken[0][1]) == 1, f"crashed worker read {taken}")
+    await run_consumer(q, process, lambda: done, 15, "orphaned job claimed")
+    expect(done == ["orphan"] and q.claimed == 1, f"claimed {q.claimed}, processed {done}")
+    pending = await q.redis.xpending(q.stream, q.group)
+    expect(pending["pending"] == 0, f"unacked entries: {pending}")
+
+
+async def check_lease_failover(prefix):
+    # Tek lider; lider release etmeden ölürse TTL dolunca diğeri devralır
+    key, ttl = f"{prefix}:leader", 1.0
+    one = contracts.LeaderLease(url=REDIS_URL, key=key, ttl=ttl, identity="one")
+    two = contracts.LeaderLease(url=REDIS_URL, key=key, ttl=ttl, identity="two")
+    ran = {"one": 0, "two": 0}
+
+    def job(name):
+        async def loop():
+            while True:
+                ran[name] += 1
+                await asyncio.sleep(0.05)
+        return loop
+
+    t1 = asyncio.create_task(one.run(job("one")))
+    await wait_until(lambda: one.is_leader, 5, "first instance elected")
+    t2 = asyncio.create_task(two.run(job("two")))
+    try:
+        await asyncio.sleep(ttl)
+        expect(one.is_leader and not two.is_leader and ran["two"] == 0, f"leaders one={one.is_leader} two={two.is_leader}")
+        t1.cancel()                     # release yok: çöken lider
+        await asyncio.gather(t1, return_exceptions=True)
+        await wait_until(lambda: two.is_leader and ran["two"] > 0, 4 * ttl, "second instance took over")
+        expect(two.elections == 1, f"elections {two.elections}")
+        await two.release()
+        expect(await two.redis.get(key) is None, "lease still held after release")
+    finally:
+        for t in (t1, t2): t.cancel()
+        await asyncio.gather(t1, t2, return_exceptions=True)
+
+
+async def check_shared_trends(prefix):
+    # Worker'ın kabul ettiği trend kaydı liderin sıralamasına geçer
+    pair = {"chainId": "solana", "pairAddress": "PairA", "url": "https://dexscreener.com/solana/paira",
+            "baseToken": {"address": "Sol1", "symbol": "CHK", "name": "Check"},
+            "priceChange": {"h24": 42.0}, "liquidity": {"usd": 50000},
+            "info": {"socials": [{"type": "telegram", "url": "https://t.me/chk"}, {"type": "twitter", "url": "https://x.com/chk"}]}}
+    worker, leader = contracts.TrendRanker(), contracts.TrendRanker()
+    shared = contracts.SharedTrends(url=REDIS_URL, key=f"{prefix}:trends", ttl=60)
+    offered = await shared.offer(worker, pair)
+    expect(offered and shared.published == 1 and not shared.errors, f"publish {shared.stats()}")
+    expect(await shared.pull(leader) == 1, f"pull {shared.stats()}")
+    expect([t[2] for t in leader.top()] == ["CHK"], f"leader top {leader.top()}")
+
+
+CHECKS = [
+    ("submit/consume/ack", check_roundtrip),
+    ("requeue/dead-letter", check_retry_dead_letter),
+    ("xautoclaim orphan", check_orphan_claim),
+    ("leader failover", check_lease_failover),
+    ("shared trends", check_shared_trends),
+]
+
+
+async def cleanup(prefix):
+    redis = contracts.get_redis(REDIS_URL)
+    keys = [k async for k in redis.scan_iter(match=f"{prefix}:*")]
+    if keys: await redis.delete(*keys)
+
+
+async def run(only):
+    prefix = f"lapad-check:{uuid.uuid4().hex[:8]}"
+    failed = []
+    try:
+        for name, check in CHECKS:
+            if only and name not in only: continue
+            started = time.perf_counter()
+            try:
+                await check(prefix)
+                print(f"ok    {name} ({time.perf_counter() - started:.1f}s)")
+            except Exception as e:
+                failed.append(name)
+                print(f"FAIL  {name}: {e!r}")
+    finally:
+        await cleanup(prefix)
+        await contracts.close_http_session()
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the Redis job queue, leader lease and shared trends against REDIS_URL.")
+    parser.add_argument("--only", help="comma-separated check names")
+    parser.add_argument("--verbose", action="store_true", help="keep bot log output")
+    args = parser.parse_args(argv)
+    if not REDIS_URL:
+        print("REDIS_URL not set, skipped.")
+        return 0
+    if not args.verbose:
+        contracts.log_success = contracts.log_info = contracts.log_error = lambda msg: None
+    failed = asyncio.run(run(set(args.only.split(",")) if args.only else None))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())